@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only serialized within the process
+    fcntl = None
+
+
+def unique_temp_path(final_path):
+    """Creates an empty temporary file next to final_path, unique across threads and processes, and returns its path."""
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(final_path) or ".",
+                                     prefix=f".{os.path.basename(final_path)}.", suffix=".tmp", delete=False) as f:
+        return f.name
+
+
+class ArtifactBundle:
+    """
+    Binary on-disk bundle holding everything needed to serve a vector index:
+    a float32 embedding matrix stored as .npy (memory-mappable), chunk metadata
+    stored as uncompressed Arrow IPC (memory-mappable), and a JSON manifest.
+    Every file is written to a temporary name and renamed into place; the manifest
+    is written last, so a bundle with a manifest is always complete.
+    Writers serialize on build_lock(), so concurrent builds, in threads or processes,
+    never mix the files of two builds. Readers take publish_lock(shared=True) so they never pair
+    the files of one build with those of the next.
+    """
+    EMBEDDINGS_FILE = "embeddings.npy"
+    METADATA_FILE = "metadata.arrow"
+    MANIFEST_FILE = "manifest.json"
+    LOCK_FILE = ".build.lock"
+    PUBLISH_LOCK_FILE = ".publish.lock"
+    FORMAT_VERSION = 1
+
+    def __init__(self, directory):
+        """
+        :param directory: Directory holding the bundle files; created on first write.
+        """
+        self.directory = directory
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+        self._publish_thread_lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def exists(self):
+        return os.path.exists(self.path(self.MANIFEST_FILE))
+
+    @contextmanager
+    def build_lock(self):
+        """
+        Held from reading the manifest of the current bundle to publishing the next one: a thread
+        lock for this process plus an exclusive file lock on the bundle directory for other processes.
+        Re-entrant within a thread.
+        """
+        with self._thread_lock:
+            self._lock_depth += 1
+            lock_file = None
+            try:
+                if self._lock_depth == 1 and fcntl is not None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    lock_file = open(self.path(self.LOCK_FILE), "a")
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+            finally:
+                if lock_file is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    lock_file.close()
+                self._lock_depth -= 1
+
+    @contextmanager
+    def publish_lock(self, shared=False):
+        """
+        Held only while the files of a build are renamed into place (exclusive) or read back (shared),
+        so readers wait for a publish to finish but never for a whole build.
+        Without fcntl it falls back to an exclusive lock within this process.
+        :param shared: Take a shared lock, for readers.
+        """
+        if fcntl is None:
+            with self._publish_thread_lock:
+                yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(self.PUBLISH_LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def checksum(embeddings):
+        """SHA-256 of the raw float32 matrix bytes."""
+        return hashlib.sha256(np.ascontiguousarray(embeddings, dtype=np.float32).data).hexdigest()
+
+    def _replace(self, name, write):
+        """Writes a file through `write(tmp_path)` and atomically renames it into place."""
+        final_path = self.path(name)
+        tmp_path = unique_temp_path(final_path)
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, final_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def write(self, embeddings, metadata, model_name, **extra):
+        """
+        Persists embeddings, metadata and manifest.
+        :param embeddings: 2-D array of shape (rows, dimension); stored as float32.
+        :param metadata: DataFrame with one row per embedding.
+        :param model_name: Name of the embedding model that produced the vectors.
+        :param extra: Additional JSON-serializable fields recorded in the manifest.
+        :return: The manifest dict that was written.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2:
+            raise ValueError(f"Embeddings must be a 2-D matrix, got shape {embeddings.shape}")
+        if len(metadata) != embeddings.shape[0]:
+            raise ValueError(f"Metadata has {len(metadata)} rows but there are {embeddings.shape[0]} embeddings")
+        os.makedirs(self.directory, exist_ok=True)
+
+        def write_embeddings(tmp_path):
+            with open(tmp_path, "wb") as f:
+                np.save(f, embeddings)
+
+        def write_metadata(tmp_path):
+            table = pa.Table.from_pandas(metadata.reset_index(drop=True), preserve_index=False)
+            # Uncompressed so the file can be memory-mapped without a decode step
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+
+        self._replace(self.EMBEDDINGS_FILE, write_embeddings)
+        self._replace(self.METADATA_FILE, write_metadata)
+
+        manifest = {
+            "format_version": self.FORMAT_VERSION,
+            "model_name": model_name,
+            "dimension": int(embeddings.shape[1]),
+            "rows": int(embeddings.shape[0]),
+            "checksum": self.checksum(embeddings),
+            "created_at": time.time(),
+            **extra,
+        }
+
+        def write_manifest(tmp_path):
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f, indent=2)
+
+        self._replace(self.MANIFEST_FILE, write_manifest)
+        return manifest
+
+    def update_manifest(self, **fields):
+        """
+        Rewrites the manifest with some fields replaced, leaving the embeddings and metadata untouched.
+        :return: The manifest dict that was written, or None if the bundle has not been written.
+        """
+        with self.build_lock():
+            manifest = self.read_manifest()
+            if manifest is None:
+                return None
+            manifest.update(fields)
+
+            def write_manifest(tmp_path):
+                with open(tmp_path, "w") as f:
+                    json.dump(manifest, f, indent=2)
+
+            self._replace(self.MANIFEST_FILE, write_manifest)
+            return manifest
+
+    def read_manifest(self):
+        """Returns the manifest dict, or None if the bundle has not been written."""
+        if not self.exists():
+            return None
+        with open(self.path(self.MANIFEST_FILE), "r") as f:
+            return json.load(f)
+
+    def load_embeddings(self, verify=False):
+        """
+        Memory-maps the embedding matrix; nothing is read until rows are touched.
+        :param verify: Recompute the checksum and compare it to the manifest (reads the whole file).
+        :return: Read-only float32 array of shape (rows, dimension).
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"No artifact bundle found in {self.directory}")
+        embeddings = np.load(self.path(self.EMBEDDINGS_FILE), mmap_mode="r")
+        if embeddings.shape != (manifest["rows"], manifest["dimension"]):
+            raise ValueError(f"Embedding matrix shape {embeddings.shape} does not match the manifest")
+        if verify and self.checksum(embeddings) != manifest["checksum"]:
+            raise ValueError(f"Checksum mismatch for {self.path(self.EMBEDDINGS_FILE)}")
+        return embeddings
+
+    def load_metadata(self, columns=None):
+        """
+        Reads the metadata table through a memory map.
+        :param columns: Optional list of columns to load.
+        :return: pandas DataFrame.
+        """
+        table = feather.read_table(self.path(self.METADATA_FILE), columns=columns, memory_map=True)
+        return table.to_pandas()
@@ -0,0 +1,123 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Dynamic batching scheduler: collects items submitted concurrently by many
+    request threads for up to max_wait_ms or max_batch_size items, runs them
+    through one handler call, and hands each caller its own result.
+    A single background thread per process does the batching; it is started on
+    first use, so a batcher created before a server forks works in every worker.
+    """
+    def __init__(self, handler, max_batch_size=32, max_wait_ms=2.0, name="micro-batcher"):
+        """
+        :param handler: Callable taking a list of items and returning a list of results in the same order.
+                        An exception instance in place of a result is raised to that item's caller only;
+                        an exception raised by the handler fails the whole batch.
+        :param max_batch_size: Largest number of items passed to one handler call.
+        :param max_wait_ms: How long the first item of a batch waits for more items to arrive.
+        :param name: Name of the background thread.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.batches = 0
+        self.items = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = Counter()
+        self.total_wait = 0.0
+
+    def submit(self, item):
+        """Queues an item and returns a Future for its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submits an item and blocks until its result is ready."""
+        return self.submit(item).result(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_queue_depth,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "batches": self.batches,
+                "items": self.items,
+                "errors": self.errors,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+                "avg_queue_wait_ms": self.total_wait * 1000.0 / self.items if self.items else 0.0,
+                "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            }
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork; start a fresh queue and worker in each process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, name=self.name, daemon=True).start()
+                self._pid = os.getpid()
+
+    def _next_batch(self):
+        """Blocks for the first item, then collects more until the batch is full or the wait is over."""
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.handler(items)
+                if len(results) != len(items):
+                    raise ValueError(f"Batch handler returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                logger.error("Batch of %d items failed: %s", len(items), e)
+                with self._lock:
+                    self.errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                self.batch_sizes[len(batch)] += 1
+                self.total_wait += sum(started - queued_at for _, _, queued_at in batch)
@@ -0,0 +1,609 @@
+"""
+End-to-end load test of the four ws_* services, runnable offline.
+
+Starts the services under gunicorn against the local OpenAI stand-in (mock_openai.py),
+drives concurrent traffic at each endpoint in turn, and writes a JSON report with
+throughput, client-side latency percentiles and the per-stage breakdown scraped from
+each service's /metrics. Reports can be compared to catch regressions:
+
+    python benchmark.py run --duration 30 --output bench/current.json --baseline bench/baseline.json
+    python benchmark.py compare bench/baseline.json bench/current.json
+
+The run exits with status 1 when a scenario regressed by more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+import numpy as np
+import requests
+from pdf_to_json import iter_pdf_paths
+from feedback_fixtures import FEEDBACK_SECTIONS, FEEDBACK_SENTENCES, synthetic_feedback, synthetic_pdf
+
+# Service name -> (gunicorn app, default port)
+SERVICES = {
+    "vsearch": ("ws_vsearch:app", 5000),
+    "prompt_renderer": ("ws_prompt_renderer:app", 5001),
+    "pdf_to_json": ("ws_pdf_to_json:app", 5002),
+    "interview_copilot": ("ws_interview_copilot:app", 5003),
+}
+MOCK_OPENAI = ("mock_openai:app", 5010)
+# Single-shot example files the copilot loads at import; not in the repository
+SAMPLE_PDF_TEXT_FILE = "docs/training data/sample_pdf.txt"
+SAMPLE_JSON_FILE = "docs/training data/sample_questions_from_pdf.json"
+SCENARIOS = ("search", "render", "upload", "copilot", "copilot_stream", "copilot_map_reduce")
+PERCENTILES = (50, 95, 99)
+
+DEFAULT_QUERIES = [
+    "Find an easy problem related to hash tables.",
+    "Give me a graph problem that uses DFS.",
+    "I need a linked list problem that involves recursion.",
+    "What is a good problem on binary search?",
+    "Suggest a problem related to topological sorting.",
+    "Find a problem that involves implementing a cache.",
+    "What is a good example of a two-pointer technique problem?",
+    "Give me a problem that is classified under dynamic programming.",
+    "Show me a problem where heap data structure is used.",
+    "I want a problem related to designing a data structure.",
+]
+
+def load_corpus(pdf_inputs=None, queries_file=None, synthetic_pdfs=8, seed=0):
+    """
+    :param pdf_inputs: Directories, PDF files or glob patterns; synthetic PDFs are generated if omitted.
+    :param queries_file: Text file with one query per line; DEFAULT_QUERIES if omitted.
+    :param synthetic_pdfs: Number of distinct synthetic PDFs to generate.
+    :return: Dict with "queries", "pdfs" as (name, bytes) pairs and "texts" used as /render inputs.
+    """
+    if queries_file:
+        with open(queries_file, "r") as file:
+            queries = [line.strip() for line in file if line.strip()]
+    else:
+        queries = list(DEFAULT_QUERIES)
+    feedback = [synthetic_feedback(seed + i) for i in range(max(synthetic_pdfs, 1))]
+    if pdf_inputs:
+        pdfs = []
+        for path in iter_pdf_paths(pdf_inputs):
+            with open(path, "rb") as file:
+                pdfs.append((os.path.basename(path), file.read()))
+        if not pdfs:
+            raise ValueError(f"No PDFs found in {pdf_inputs}")
+    else:
+        pdfs = [(f"synthetic-{i}.pdf", synthetic_pdf(pages)) for i, pages in enumerate(feedback)]
+    texts = ["\n".join(line for page in pages for line in page) for pages in feedback]
+    return {"queries": queries, "pdfs": pdfs, "texts": texts}
+
+
+class ServiceStack:
+    """
+    Runs the mock OpenAI server and the four services as gunicorn subprocesses, wired to each
+    other on localhost. The copilot always talks to the mock, never to the real API.
+    Missing copilot sample files are generated for the run and the vector index is built
+    through POST /index if vsearch has none, so a clean checkout can be benchmarked.
+    Metrics are kept per process, so one worker per service (the default) gives exact stage breakdowns.
+    """
+    def __init__(self, workers=1, threads=8, log_dir="logs/benchmark", env=None, startup_timeout=600):
+        """
+        :param workers: gunicorn workers per service (WEB_CONCURRENCY).
+        :param threads: Threads per worker (GUNICORN_THREADS).
+        :param log_dir: Directory receiving one log file per service.
+        :param env: Extra environment for all services, e.g. MOCK_OPENAI_LATENCY_MS or RESPONSE_CACHE.
+        :param startup_timeout: Seconds to wait for every service to report ready.
+        """
+        self.workers = workers
+        self.threads = threads
+        self.log_dir = log_dir
+        self.env = env or {}
+        self.startup_timeout = startup_timeout
+        self.processes = {}
+        self.generated_files = []
+
+    def urls(self, host="localhost"):
+        return {name: f"http://{host}:{port}" for name, (_, port) in dict(SERVICES, mock_openai=MOCK_OPENAI).items()}
+
+    def service_env(self):
+        urls = self.urls()
+        env = dict(os.environ)
+        env.update({
+            "WEB_CONCURRENCY": str(self.workers),
+            "GUNICORN_THREADS": str(self.threads),
+            "OPENAI_API_KEY": "benchmark",
+            "OPENAI_BASE_URL": f"{urls['mock_openai']}/v1",
+            "VSEARCH_URL": f"{urls['vsearch']}/search",
+            "VSEARCH_BATCH_URL": f"{urls['vsearch']}/search/batch",
+            "PROMPT_RENDERER_URL": f"{urls['prompt_renderer']}/render",
+            "PDF_TO_JSON_URL": f"{urls['pdf_to_json']}/upload",
+            # Measure the full pipeline on every request unless caching is asked for
+            "RESPONSE_CACHE": "off",
+        })
+        env.update(self.env)
+        return env
+
+    def start(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.generate_sample_files()
+        env = self.service_env()
+        for name, (app, port) in dict(mock_openai=MOCK_OPENAI, **SERVICES).items():
+            service_env = dict(env, PORT=str(port))
+            if name == "mock_openai":
+                # The mock only sleeps, so give it enough threads to never be the bottleneck
+                service_env.update(WEB_CONCURRENCY="1", GUNICORN_THREADS="64")
+            log = open(os.path.join(self.log_dir, f"{name}.log"), "w")
+            self.processes[name] = (subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", app],
+                                                     env=service_env, stdout=log, stderr=subprocess.STDOUT), log)
+        self.wait_ready()
+        self.ensure_index()
+
+    def generate_sample_files(self):
+        """Writes placeholder copilot sample files where none exist; stop() removes them again."""
+        pages = synthetic_feedback(0, sentences_per_section=3)
+        sample_json = {"questions": [{"interview": section, "question": "Implement an LRU cache.",
+                                      "response": FEEDBACK_SENTENCES[4], "language": "Python"}
+                                     for section in FEEDBACK_SECTIONS]}
+        placeholders = {SAMPLE_PDF_TEXT_FILE: "\n".join(line for page in pages for line in page),
+                        SAMPLE_JSON_FILE: json.dumps(sample_json, indent=2)}
+        for path, content in placeholders.items():
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as file:
+                    file.write(content)
+                self.generated_files.append(path)
+
+    def ensure_index(self):
+        """Builds the vector index through POST /index unless vsearch already serves searches."""
+        url = self.urls()["vsearch"]
+        if requests.get(f"{url}/search", params={"query": "index check"}, timeout=30).status_code != 503:
+            return
+        print("No vector index, building it through POST /index")
+        response = requests.post(f"{url}/index", params={"incremental": "true"}, timeout=self.startup_timeout)
+        if not response.ok:
+            raise RuntimeError(f"Building the index failed: HTTP {response.status_code} {response.text[:200]}")
+        # The other workers load the new index within VSEARCH_REFRESH_INTERVAL seconds
+        deadline = time.monotonic() + self.startup_timeout
+        served = 0
+        while served < 2 * self.workers:
+            if requests.get(f"{url}/search", params={"query": "index check"}, timeout=30).ok:
+                served += 1
+                continue
+            served = 0
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"vsearch does not serve the new index after {self.startup_timeout}s")
+            time.sleep(0.5)
+
+    def wait_ready(self):
+        deadline = time.monotonic() + self.startup_timeout
+        for name, url in self.urls().items():
+            path = "/health" if name == "mock_openai" else "/ready"
+            while True:
+                process = self.processes[name][0]
+                if process.poll() is not None:
+                    raise RuntimeError(f"{name} exited with status {process.returncode}, "
+                                       f"see {os.path.join(self.log_dir, name + '.log')}")
+                try:
+                    if requests.get(url + path, timeout=2).ok:
+                        break
+                except requests.RequestException:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{name} not ready after {self.startup_timeout}s")
+                time.sleep(0.5)
+
+    def stop(self):
+        for process, _ in self.processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process, log in self.processes.values():
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+        self.processes = {}
+        for path in self.generated_files:
+            os.remove(path)
+        self.generated_files = []
+
+    def __enter__(self):
+        try:
+            self.start()
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$")
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_metrics(text):
+    """Parses the Prometheus text format into {(name, ((label, value), ...)): value}."""
+    samples = {}
+    for line in text.splitlines():
+        match = SAMPLE.match(line)
+        if match and not line.startswith("#"):
+            name, labels, value = match.groups()
+            samples[(name, tuple(sorted(LABEL.findall(labels or ""))))] = float(value)
+    return samples
+
+
+def histogram_quantile(quantile, buckets):
+    """
+    Estimates a quantile from cumulative histogram buckets by linear interpolation, like Prometheus.
+    :param buckets: Sorted (upper bound, cumulative count) pairs ending with the +Inf bucket.
+    """
+    total = buckets[-1][1] if buckets else 0
+    if not total:
+        return None
+    rank = quantile * total
+    lower, below = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - below) / (count - below) if count > below else bound
+        lower, below = bound, count
+    return lower
+
+
+def summarize_histogram(before, after, name, label):
+    """
+    Summarizes the observations a histogram received between two scrapes, grouped by one label.
+    :return: {label value: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"}}.
+    """
+    groups = {}
+    for (sample, labels), value in after.items():
+        if not sample.startswith(name + "_"):
+            continue
+        delta = value - before.get((sample, labels), 0.0)
+        labels = dict(labels)
+        group = groups.setdefault(labels.get(label, ""), {"buckets": Counter(), "sum": 0.0, "count": 0.0})
+        if sample == name + "_bucket":
+            group["buckets"][float(labels["le"])] += delta
+        elif sample == name + "_sum":
+            group["sum"] += delta
+        elif sample == name + "_count":
+            group["count"] += delta
+
+    summary = {}
+    for key, group in sorted(groups.items()):
+        if not group["count"]:
+            continue
+        buckets = sorted(group["buckets"].items())
+        summary[key] = dict({"count": int(group["count"]), "mean_ms": group["sum"] / group["count"] * 1000.0},
+                            **{f"p{p}_ms": histogram_quantile(p / 100.0, buckets) * 1000.0 for p in PERCENTILES})
+    return summary
+
+
+def latency_summary(seconds):
+    if not seconds:
+        return {}
+    milliseconds = np.asarray(seconds) * 1000.0
+    summary = {"mean": float(milliseconds.mean()), "max": float(milliseconds.max())}
+    summary.update({f"p{p}": float(value) for p, value in zip(PERCENTILES, np.percentile(milliseconds, PERCENTILES))})
+    return summary
+
+
+class LoadRunner:
+    """
+    Drives closed-loop load: `concurrency` clients each send their next request as soon as the
+    previous one completes, for `duration` seconds or until `max_requests` requests were sent.
+    Scenarios run one after another, so the /metrics deltas of a scenario only contain its own traffic.
+    """
+    def __init__(self, urls, corpus, concurrency=8, duration=20.0, max_requests=None, warmup=5, timeout=120.0):
+        """
+        :param urls: Service name -> base URL, as returned by ServiceStack.urls.
+        :param corpus: Queries, PDFs and texts from load_corpus.
+        :param concurrency: Concurrent clients.
+        :param duration: Seconds each scenario runs.
+        :param max_requests: Optional cap on the requests of each scenario.
+        :param warmup: Requests sent before measuring each scenario.
+        :param timeout: Per-request timeout in seconds.
+        """
+        self.urls = urls
+        self.corpus = corpus
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.warmup = warmup
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # One keep-alive session per client thread
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def call(self, scenario, i):
+        """
+        Sends the i-th request of a scenario.
+        :return: (error or None, latency in seconds, seconds to the first streamed token or None).
+        """
+        query = self.corpus["queries"][i % len(self.corpus["queries"])]
+        name, pdf = self.corpus["pdfs"][i % len(self.corpus["pdfs"])]
+        text = self.corpus["texts"][i % len(self.corpus["texts"])]
+        started = time.perf_counter()
+        first_token = None
+        stream = False
+        try:
+            if scenario == "search":
+                response = self.session.get(f"{self.urls['vsearch']}/search", params={"query": query, "top_k": 5},
+                                            timeout=self.timeout)
+            elif scenario == "render":
+                response = self.session.post(f"{self.urls['prompt_renderer']}/render", timeout=self.timeout, json={
+                    "user_query": query, "single_shot_prompt_pdf_text": text, "single_shot_prompt_json": "{}",
+                    "input_pdf_text": text, "rag_results": FEEDBACK_SENTENCES[:5]})
+            elif scenario == "upload":
+                response = self.session.post(f"{self.urls['pdf_to_json']}/upload", files={"file": (name, pdf)},
+                                             timeout=self.timeout)
+            elif scenario in ("copilot", "copilot_stream"):
+                stream = scenario == "copilot_stream"
+                response = self.session.post(f"{self.urls['interview_copilot']}/copilot", timeout=self.timeout,
+                                             files={"file": (name, pdf, "application/pdf")},
+                                             data={"query": query, "stream": str(stream).lower()}, stream=stream)
+                if stream and response.ok:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if line == "event: token" and first_token is None:
+                            first_token = time.perf_counter() - started
+                        elif line == "event: error":
+                            return "stream error event", time.perf_counter() - started, first_token
+            elif scenario == "copilot_map_reduce":
+                response = self.session.post(f"{self.urls['interview_copilot']}/copilot", timeout=self.timeout,
+                                             files={"file": (name, pdf, "application/pdf")},
+                                             data={"query": query, "mode": "map_reduce"})
+            else:
+                raise ValueError(f"Unknown scenario: {scenario}")
+            if not stream:
+                response.content  # the latency includes reading the whole body
+        except requests.RequestException as e:
+            return type(e).__name__, time.perf_counter() - started, first_token
+        error = None if response.ok else f"HTTP {response.status_code}"
+        return error, time.perf_counter() - started, first_token
+
+    def scrape(self):
+        """Scrapes /metrics of every ws_* service."""
+        scraped = {}
+        for name in SERVICES:
+            try:
+                scraped[name] = parse_metrics(requests.get(f"{self.urls[name]}/metrics", timeout=10).text)
+            except requests.RequestException:
+                scraped[name] = {}
+        return scraped
+
+    def run_scenario(self, scenario):
+        for i in range(self.warmup):
+            self.call(scenario, i)
+
+        before = self.scrape()
+        latencies, first_tokens, errors = [], [], Counter()
+        lock = threading.Lock()
+        sent = 0
+        started = time.perf_counter()
+        deadline = started + self.duration
+
+        def client():
+            nonlocal sent
+            while time.perf_counter() < deadline:
+                with lock:
+                    if self.max_requests is not None and sent >= self.max_requests:
+                        return
+                    i = sent
+                    sent += 1
+                error, latency, first_token = self.call(scenario, self.warmup + i)
+                with lock:
+                    if error:
+                        errors[error] += 1
+                    else:
+                        latencies.append(latency)
+                        if first_token is not None:
+                            first_tokens.append(first_token)
+
+        clients = [threading.Thread(target=client, name=f"bench-{scenario}-{n}") for n in range(self.concurrency)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        after = self.scrape()
+
+        completed = len(latencies)
+        result = {
+            "requests": completed + sum(errors.values()),
+            "errors": sum(errors.values()),
+            "error_rate": sum(errors.values()) / max(completed + sum(errors.values()), 1),
+            "error_kinds": dict(errors),
+            "seconds": elapsed,
+            "throughput_rps": completed / elapsed if elapsed else 0.0,
+            "latency_ms": latency_summary(latencies),
+            "stages": {},
+            "endpoints": {},
+        }
+        if first_tokens:
+            result["first_token_ms"] = latency_summary(first_tokens)
+        for name in SERVICES:
+            stages = summarize_histogram(before[name], after[name], "interview_eval_stage_seconds", "stage")
+            if stages:
+                result["stages"][name] = stages
+            endpoints = summarize_histogram(before[name], after[name], "interview_eval_http_request_seconds",
+                                            "endpoint")
+            endpoints.pop("/metrics", None)
+            if endpoints:
+                result["endpoints"][name] = endpoints
+        return result
+
+    def run(self, scenarios, log=None):
+        log = log if log else (lambda line: print(line, file=sys.stderr))
+        results = {}
+        for scenario in scenarios:
+            log(f"Running {scenario}: {self.concurrency} clients for {self.duration:g}s")
+            results[scenario] = self.run_scenario(scenario)
+            log(format_scenario(scenario, results[scenario]))
+        return results
+
+
+def format_scenario(scenario, result):
+    latency = result["latency_ms"]
+    line = (f"{scenario:<15} {result['throughput_rps']:8.1f} req/s  p50 {latency.get('p50', 0):8.1f} ms  "
+            f"p95 {latency.get('p95', 0):8.1f} ms  p99 {latency.get('p99', 0):8.1f} ms  errors {result['errors']}")
+    if "first_token_ms" in result:
+        line += f"  first token p50 {result['first_token_ms']['p50']:.1f} ms"
+    return line
+
+
+def compare(baseline, current, threshold=0.10, min_delta_ms=5.0):
+    """
+    Compares two benchmark reports.
+    A scenario regresses when a latency percentile grows, or its throughput drops, by more than
+    threshold (a fraction), or its error rate grows by more than a percentage point. Latency changes
+    below min_delta_ms are ignored as noise. Stage changes are reported but never fail the comparison.
+    :return: (regressions, notes) as lists of human-readable lines.
+    """
+    regressions, notes = [], []
+    for scenario, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if previous is None:
+            notes.append(f"{scenario}: not in the baseline")
+            continue
+        for percentile in (f"p{p}" for p in PERCENTILES):
+            old, new = previous["latency_ms"].get(percentile), result["latency_ms"].get(percentile)
+            if old and new and new - old > max(old * threshold, min_delta_ms):
+                regressions.append(f"{scenario}: {percentile} latency {old:.1f} ms -> {new:.1f} ms "
+                                   f"(+{(new / old - 1) * 100:.0f}%)")
+        old, new = previous["throughput_rps"], result["throughput_rps"]
+        if old and new < old * (1 - threshold):
+            regressions.append(f"{scenario}: throughput {old:.1f} -> {new:.1f} req/s (-{(1 - new / old) * 100:.0f}%)")
+        if result["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(f"{scenario}: error rate {previous['error_rate']:.1%} -> {result['error_rate']:.1%}")
+
+        for service, stages in result.get("stages", {}).items():
+            for stage, summary in stages.items():
+                old_stage = previous.get("stages", {}).get(service, {}).get(stage)
+                if old_stage and summary["mean_ms"] - old_stage["mean_ms"] > max(old_stage["mean_ms"] * threshold,
+                                                                                 min_delta_ms):
+                    notes.append(f"{scenario}: {service} stage {stage} mean {old_stage['mean_ms']:.1f} ms -> "
+                                 f"{summary['mean_ms']:.1f} ms")
+    return regressions, notes
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    corpus = load_corpus(args.pdf, args.queries, args.synthetic_pdfs, args.seed)
+    env = {"MOCK_OPENAI_LATENCY_MS": str(args.mock_latency_ms), "MOCK_OPENAI_TOKEN_MS": str(args.mock_token_ms),
+           "MOCK_OPENAI_COMPLETION_TOKENS": str(args.mock_completion_tokens)}
+    if args.response_cache:
+        env["RESPONSE_CACHE"] = "memory"
+    stack = ServiceStack(args.workers, args.threads, args.log_dir, env, args.startup_timeout)
+    urls = stack.urls(args.host)
+    runner = LoadRunner(urls, corpus, args.concurrency, args.duration, args.requests, args.warmup, args.timeout)
+
+    report = {
+        "meta": {
+            "started": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "max_requests": args.requests,
+            "workers": args.workers,
+            "threads": args.threads,
+            "pdfs": len(corpus["pdfs"]),
+            "queries": len(corpus["queries"]),
+            "service_env": None if args.no_start else env,
+        },
+    }
+    if args.no_start:
+        report["scenarios"] = runner.run(args.scenarios)
+    else:
+        with stack:
+            report["scenarios"] = runner.run(args.scenarios)
+
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+        print(f"Report written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            return report_comparison(json.load(file), report, args.threshold)
+    return 0
+
+
+def report_comparison(baseline, current, threshold):
+    regressions, notes = compare(baseline, current, threshold)
+    for line in notes:
+        print(f"[note] {line}", file=sys.stderr)
+    for line in regressions:
+        print(f"[regression] {line}", file=sys.stderr)
+    print(f"{len(regressions)} regressions over {threshold:.0%}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the interview-eval services offline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Start the services and run the load test")
+    run_parser.add_argument("-s", "--scenarios", type=lambda value: value.split(","), default=list(SCENARIOS),
+                            help=f"Comma-separated scenarios (default: {','.join(SCENARIOS)})")
+    run_parser.add_argument("-c", "--concurrency", type=int, default=8, help="Concurrent clients (default: 8)")
+    run_parser.add_argument("-d", "--duration", type=float, default=20.0, help="Seconds per scenario (default: 20)")
+    run_parser.add_argument("-n", "--requests", type=int, default=None, help="Cap on the requests per scenario")
+    run_parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per scenario (default: 5)")
+    run_parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    run_parser.add_argument("--pdf", nargs="*", help="PDF files, directories or globs (default: synthetic PDFs)")
+    run_parser.add_argument("--synthetic-pdfs", type=int, default=8, help="Distinct synthetic PDFs (default: 8)")
+    run_parser.add_argument("--queries", help="File with one query per line (default: built-in queries)")
+    run_parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpus")
+    run_parser.add_argument("--mock-latency-ms", type=float, default=400.0, help="Mock LLM time to first token")
+    run_parser.add_argument("--mock-token-ms", type=float, default=10.0, help="Mock LLM time per token")
+    run_parser.add_argument("--mock-completion-tokens", type=int, default=120, help="Mock LLM response length")
+    run_parser.add_argument("--response-cache", action="store_true", help="Keep the copilot response cache on")
+    run_parser.add_argument("--workers", type=int, default=1, help="gunicorn workers per service (default: 1)")
+    run_parser.add_argument("--threads", type=int, default=8, help="Threads per worker (default: 8)")
+    run_parser.add_argument("--no-start", action="store_true", help="Benchmark services that are already running")
+    run_parser.add_argument("--host", default="localhost", help="Host of the services (default: localhost)")
+    run_parser.add_argument("--startup-timeout", type=float, default=600.0, help="Seconds to wait for readiness")
+    run_parser.add_argument("--log-dir", default="logs/benchmark", help="Service logs (default: logs/benchmark)")
+    run_parser.add_argument("-o", "--output", default="-", help="JSON report file, '-' for stdout")
+    run_parser.add_argument("--baseline", help="Report to compare against; exits with 1 on a regression")
+    run_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed regression (default: 0.10)")
+
+    compare_parser = commands.add_parser("compare", help="Compare two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed regression (default: 0.10)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        unknown = set(args.scenarios) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        sys.exit(run(args))
+    with open(args.baseline, "r") as file:
+        baseline = json.load(file)
+    with open(args.current, "r") as file:
+        current = json.load(file)
+    sys.exit(report_comparison(baseline, current, args.threshold))
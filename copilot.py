@@ -1,13 +1,23 @@
-from vectordb import VectorInterviewDb
-from openai import OpenAI
+from typing import TYPE_CHECKING
 from promptRenderer import PromptRenderer
 import os
 import logging
 from jinja2 import Template
 import json
-import tiktoken
+import time
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
-import requests
+from service_client import ServiceClient
+from token_budget import TokenBudget
+from response_cache import ResponseCache
+from rate_limiter import RateLimiter
+from metrics import STAGE_SECONDS, TOKENS, timed
+
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from vectordb import VectorInterviewDb
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,85 +31,391 @@ openai_key = os.getenv("OPENAI_API_KEY")
 if not openai_key:
     raise ValueError("OPENAI_API_KEY not found in .env file")
 
-vector_db = VectorInterviewDb("docs/interview_questions.xlsx")
-
 VSEARCH_URL = os.getenv('VSEARCH_URL', 'http://localhost:5000/search')
+VSEARCH_BATCH_URL = os.getenv('VSEARCH_BATCH_URL', 'http://localhost:5000/search/batch')
 PROMPT_RENDERER_URL = os.getenv('PROMPT_RENDERER_URL', 'http://localhost:5001/render')
 
 class InterviewCopilot:
-    def __init__(self, prompt_template: str, vector_db: VectorInterviewDb):
+    MODEL = "gpt-4"
+    MAX_TOKENS = 500
+    SYSTEM_PROMPT = "You are an AI interview assistant."
+    # Characters of a section appended to the user query to retrieve the questions relevant to that section
+    SECTION_QUERY_CHARS = 1000
+
+    def __init__(self, prompt_template: str, vector_db: "VectorInterviewDb" = None, openai_client: "OpenAI" = None,
+                 service_client: ServiceClient = None, token_budget: TokenBudget = None,
+                 response_cache: ResponseCache = None, rate_limiter: RateLimiter = None, map_concurrency: int = None):
         """
         Initializes the InterviewCopilot class.
-        :param prompt_template: Jinja2 template for prompt rendering.
+        :param prompt_template: Jinja2 template file name or source for prompt rendering.
         :param vector_db: Instance of VectorInterviewDb for RAG retrieval.
+        :param openai_client: OpenAI client; one is created from OPENAI_API_KEY if omitted.
+        :param service_client: Pooled client for the search and render services.
+        :param token_budget: Budget the prompt inputs are trimmed to; derived from MODEL and MAX_TOKENS if omitted.
+        :param response_cache: Cache for LLM responses; every query calls the LLM if omitted.
+        :param rate_limiter: Limits the rate of LLM calls; read from LLM_RATE_LIMIT_RPM if omitted, unlimited if unset.
+        :param map_concurrency: LLM calls run at once by run_map_reduce in each process; defaults to
+                                MAP_REDUCE_CONCURRENCY or 5.
         """
         self.renderer = PromptRenderer(prompt_template)
         self.vector_db = vector_db
-        self.openai_client = OpenAI(api_key=openai_key)
+        self._openai_client = openai_client
+        self.service_client = service_client if service_client else ServiceClient()
+        self.token_budget = token_budget if token_budget else TokenBudget(self.MODEL, self.MAX_TOKENS)
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter if rate_limiter else RateLimiter.from_env()
+        self.map_concurrency = map_concurrency if map_concurrency else int(os.getenv("MAP_REDUCE_CONCURRENCY", 5))
+        self._map_executor = None
+        self._map_pid = None
+        self._map_lock = threading.Lock()
+
+    @property
+    def openai_client(self) -> "OpenAI":
+        """The OpenAI client; the openai package is imported when the first client is created."""
+        if self._openai_client is None:
+            from openai import OpenAI
+            self._openai_client = OpenAI(api_key=openai_key)
+        return self._openai_client
+
+    @property
+    def map_executor(self) -> ThreadPoolExecutor:
+        """Thread pool running the map calls of run_map_reduce; threads do not survive a fork, so one per process."""
+        if self._map_pid != os.getpid():
+            with self._map_lock:
+                if self._map_pid != os.getpid():
+                    self._map_executor = ThreadPoolExecutor(max_workers=self.map_concurrency,
+                                                            thread_name_prefix="copilot-map")
+                    self._map_pid = os.getpid()
+        return self._map_executor
+
+    def warm_up(self):
+        """Creates the OpenAI client and loads the tokenizer and prompt template ahead of the first request."""
+        self.openai_client
+        self.token_budget.count("warm up")
+        self.renderer.variables()
+
+    def search(self, user_query: str, top_k: int = 5) -> list:
+        """
+        Retrieves the chunks most relevant to the query from the vector search service,
+        one per question, so several chunks of the same question never take up RAG slots.
+        :return: List of chunk texts.
+        """
+        with timed("rag_search"):
+            search_results = self.service_client.get_json(VSEARCH_URL,
+                                                          params={"query": user_query, "top_k": top_k,
+                                                                  "collapse": "true"})["results"]
+        return [result['chunk'] for result in search_results]
+
+    def start_search(self, user_query: str, top_k: int = 5) -> Future:
+        """Starts the vector search in the background so it overlaps with other work, e.g. PDF extraction."""
+        return self.service_client.submit(self.search, user_query, top_k)
 
-    def process_query(self, user_query: str, pdf_text: str, sample_pdf_text: str = "", sample_json: str = "{}") -> str:
+    def process_query(self, user_query: str, pdf_text: str, sample_pdf_text: str = "", sample_json: str = "{}",
+                      rag_results=None) -> str:
         """
         Processes the user query using RAG and OpenAI LLM.
         :param user_query: The query string provided by the user.
         :param pdf_text: The text extracted from the PDF document.
         :param sample_pdf_text: Example PDF text for the template.
         :param sample_json: Example JSON for the template.
+        :param rag_results: Chunks already retrieved (a list, or the Future from start_search); searched here if omitted.
         :return: AI-generated response.
         """
-        # Call the remote search endpoint
-        response = requests.get(
-            VSEARCH_URL,
-            params={
-                "query": user_query,
-                "top_k": 5
-            }
+        return self.run(user_query, pdf_text, sample_pdf_text, sample_json, rag_results)["response"]
+
+    def run(self, user_query: str, pdf_text: str, sample_pdf_text: str = "", sample_json: str = "{}",
+            rag_results=None) -> dict:
+        """
+        Same as process_query, but also reports token usage.
+        :return: Dict with the AI-generated "response" and the "usage" report from budget_inputs,
+                 completed with the token counts returned by the API, or the cache tier that answered.
+        """
+        rag_results = self.resolve_rag_results(user_query, rag_results)
+        context_key = self.context_key(pdf_text, sample_pdf_text, sample_json)
+        pdf_text, sample_pdf_text, rag_results, usage = self.budget_inputs(
+            user_query, pdf_text, sample_pdf_text, sample_json, rag_results)
+        prompt = self.render_prompt(user_query, pdf_text, sample_pdf_text, sample_json, rag_results)
+
+        return {"response": self.complete(prompt, context_key, user_query, usage), "usage": usage}
+
+    def complete(self, prompt: str, context_key, user_query: str, usage: dict) -> str:
+        """
+        Answers a rendered prompt from the response cache or the LLM, within the rate limit.
+        :param usage: Report from budget_inputs; completed with the API token counts or the cache tier.
+        :return: The response text.
+        """
+        request_key, cached = self.cached_response(prompt, context_key, user_query, usage)
+        if cached is not None:
+            return cached
+
+        self.wait_for_rate_limit()
+        with timed("llm"):
+            response = self.openai_client.chat.completions.create(
+                model=self.MODEL,
+                messages=self.chat_messages(prompt),
+                max_tokens=self.MAX_TOKENS
+            )
+        usage.update(self.api_usage(response.usage))
+        content = response.choices[0].message.content
+        if self.response_cache is not None:
+            self.response_cache.store(request_key, context_key, user_query, content)
+        return content
+
+    def wait_for_rate_limit(self):
+        if self.rate_limiter is not None:
+            STAGE_SECONDS.observe(self.rate_limiter.acquire(), stage="llm_rate_limit_wait")
+
+    def search_sections(self, user_query: str, contents: list, top_k: int = 5) -> list:
+        """
+        Retrieves the chunks relevant to each section in one call to the batch search service,
+        querying with the user query followed by the start of the section.
+        :return: One list of chunk texts per section.
+        """
+        queries = [f"{user_query}\n{content[:self.SECTION_QUERY_CHARS]}" for content in contents]
+        with timed("rag_search"):
+            results = self.service_client.post_json(VSEARCH_BATCH_URL,
+                                                    json={"queries": queries, "top_k": top_k,
+                                                          "collapse": True})["results"]
+        return [[result['chunk'] for result in section_results] for section_results in results]
+
+    def map_section(self, user_query: str, section: dict, rag_results: list, sample_pdf_text: str,
+                    sample_json: str) -> dict:
+        """
+        Map step of run_map_reduce: budgets, renders and answers the prompt of one interview section.
+        A failure is returned rather than raised, so the other sections still make it into the result.
+        :return: Dict with the section name under "interview" and its "response" and "usage", or its "error".
+        """
+        try:
+            context_key = self.context_key(section["content"], sample_pdf_text, sample_json)
+            pdf_text, section_sample_pdf_text, rag_results, usage = self.budget_inputs(
+                user_query, section["content"], sample_pdf_text, sample_json, rag_results)
+            prompt = self.render_prompt(user_query, pdf_text, section_sample_pdf_text, sample_json, rag_results)
+            return {"interview": section["interview"],
+                    "response": self.complete(prompt, context_key, user_query, usage), "usage": usage}
+        except Exception as e:
+            logger.error("Section %s failed: %s", section["interview"], e)
+            return {"interview": section["interview"], "error": str(e)}
+
+    def run_map_reduce(self, user_query: str, sections: list, sample_pdf_text: str = "", sample_json: str = "{}",
+                       top_k: int = 5) -> dict:
+        """
+        Answers the query for every interview section of a PDF: the chunks of all sections are retrieved
+        in one batch search, each section is rendered and sent to the LLM in its own prompt, at most
+        map_concurrency at a time, and the JSON answers are merged into one by merge_section_results.
+        :param sections: Sections from the PDF service, dicts with "interview" and "content"; empty ones are skipped.
+        :return: Dict with the merged "response" (a JSON string), the per-section results under "sections"
+                 and the "usage" summed over the sections.
+        """
+        sections = [section for section in sections if (section.get("content") or "").strip()]
+        if not sections:
+            raise ValueError("The PDF has no interview section with content")
+
+        rag_results = self.search_sections(user_query, [section["content"] for section in sections], top_k)
+        futures = [self.map_executor.submit(contextvars.copy_context().run, self.map_section, user_query, section,
+                                            section_rag, sample_pdf_text, sample_json)
+                   for section, section_rag in zip(sections, rag_results)]
+        results = [future.result() for future in futures]
+
+        failed = [result for result in results if "error" in result]
+        if len(failed) == len(results):
+            raise RuntimeError(f"Every section failed, e.g. {failed[0]['interview']}: {failed[0]['error']}")
+
+        usage = {"section_count": len(results), "failed_sections": len(failed),
+                 "cached_sections": sum(result.get("usage", {}).get("cache", "miss") != "miss" for result in results)}
+        for result in results:
+            for name, value in result.get("usage", {}).items():
+                if name.endswith("tokens") or name == "prompt_tokens_estimate":
+                    usage[name] = usage.get(name, 0) + value
+        with timed("reduce"):
+            merged = self.merge_section_results(results)
+        return {"response": json.dumps(merged), "sections": results, "usage": usage}
+
+    @classmethod
+    def merge_section_results(cls, results: list) -> dict:
+        """
+        Reduce step of run_map_reduce. Lists in the section answers (e.g. "questions") are concatenated
+        in section order, their objects tagged with the section under "interview"; other values are kept
+        per section under "by_interview". Answers that are not JSON go to "unparsed", failures to "errors".
+        """
+        merged = {}
+        for result in results:
+            interview = result["interview"]
+            if "error" in result:
+                merged.setdefault("errors", []).append({"interview": interview, "error": result["error"]})
+                continue
+            answer = cls.parse_json_response(result["response"])
+            if answer is None:
+                merged.setdefault("unparsed", []).append({"interview": interview, "response": result["response"]})
+                continue
+            for key, value in answer.items():
+                if isinstance(value, list):
+                    merged.setdefault(key, []).extend(
+                        dict(item, interview=item.get("interview", interview)) if isinstance(item, dict) else item
+                        for item in value)
+                else:
+                    merged.setdefault("by_interview", {}).setdefault(interview, {})[key] = value
+        return merged
+
+    @staticmethod
+    def parse_json_response(content: str):
+        """
+        Parses the JSON object in an LLM answer, which may be wrapped in prose or a code fence.
+        A top-level list is returned as {"items": [...]}.
+        :return: The parsed dict, or None if the answer holds no JSON.
+        """
+        for start, end in (("{", "}"), ("[", "]")):
+            first, last = content.find(start), content.rfind(end)
+            if first == -1 or last <= first:
+                continue
+            try:
+                answer = json.loads(content[first:last + 1])
+            except ValueError:
+                continue
+            return answer if isinstance(answer, dict) else {"items": answer}
+        return None
+
+    def process_query_stream(self, user_query: str, pdf_text: str, sample_pdf_text: str = "", sample_json: str = "{}",
+                             rag_results=None):
+        """
+        Streaming variant of process_query. Yields (event, data) tuples as each stage finishes:
+        "rag_ready" with the retrieved chunks, "prompt_rendered", one "token" per LLM delta,
+        and finally "done" with the full response. A cached response arrives as a single "token".
+        """
+        rag_results = self.resolve_rag_results(user_query, rag_results)
+        context_key = self.context_key(pdf_text, sample_pdf_text, sample_json)
+        pdf_text, sample_pdf_text, rag_results, usage = self.budget_inputs(
+            user_query, pdf_text, sample_pdf_text, sample_json, rag_results)
+        yield "rag_ready", {"rag_results": rag_results}
+
+        prompt = self.render_prompt(user_query, pdf_text, sample_pdf_text, sample_json, rag_results)
+        yield "prompt_rendered", {"characters": len(prompt), "prompt_tokens": usage["prompt_tokens_estimate"]}
+
+        request_key, cached = self.cached_response(prompt, context_key, user_query, usage)
+        if cached is not None:
+            yield "token", {"text": cached}
+            yield "done", {"response": cached, "usage": usage}
+            return
+
+        self.wait_for_rate_limit()
+        started = time.perf_counter()
+        stream = self.openai_client.chat.completions.create(
+            model=self.MODEL,
+            messages=self.chat_messages(prompt),
+            max_tokens=self.MAX_TOKENS,
+            stream=True,
+            stream_options={"include_usage": True}
         )
-        
-        if response.status_code != 200:
-            raise Exception(f"Search request failed: {response.text}")
-        
-        search_results = response.json()["results"]
-        formatted_rag_results = [result['chunk'] for result in search_results]
+        parts = []
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not parts:
+                    STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_first_token")
+                parts.append(delta)
+                yield "token", {"text": delta}
+            if getattr(chunk, "usage", None):
+                # Sent on the last chunk, which has no choices
+                usage.update(self.api_usage(chunk.usage))
+
+        # Includes the time the client took to consume the tokens
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm")
+        content = "".join(parts)
+        if self.response_cache is not None:
+            self.response_cache.store(request_key, context_key, user_query, content)
+        yield "done", {"response": content, "usage": usage}
+
+    def context_key(self, pdf_text: str, sample_pdf_text: str, sample_json: str):
+        """Cache key of everything in a request except the query, scoping near-duplicate query matches."""
+        if self.response_cache is None:
+            return None
+        return ResponseCache.key(self.MODEL, self.MAX_TOKENS, self.SYSTEM_PROMPT, pdf_text, sample_pdf_text, sample_json)
+
+    def cached_response(self, prompt: str, context_key, user_query: str, usage: dict):
+        """
+        Looks the request up in the response cache and records the answering tier in usage["cache"].
+        :return: (request_key, cached response or None).
+        """
+        if self.response_cache is None:
+            return None, None
+        request_key = ResponseCache.key(self.MODEL, self.MAX_TOKENS, self.SYSTEM_PROMPT, prompt)
+        response, tier = self.response_cache.lookup(request_key, context_key, user_query)
+        usage["cache"] = tier or "miss"
+        return request_key, response
+
+    def budget_inputs(self, user_query: str, pdf_text: str, sample_pdf_text: str, sample_json: str, rag_results: list):
+        """
+        Counts the tokens of each prompt input and trims the RAG chunks and PDF texts to the token budget.
+        Only inputs the template actually renders are counted; the template itself is measured by
+        rendering it locally with empty inputs, assuming the render service uses the same template file.
+        :return: (pdf_text, sample_pdf_text, rag_results, usage) with the trimmed inputs and the usage report.
+        """
+        with timed("token_budget"):
+            used = self.renderer.variables()
+            skeleton = self.renderer.render(user_query, "", "{}", "", [])
+            fixed_tokens = self.token_budget.count_messages(self.chat_messages(skeleton))
+            if "single_shot_prompt_json" in used:
+                fixed_tokens += self.token_budget.count(sample_json)
+
+            sections = {}
+            if "single_shot_prompt_pdf_text" in used:
+                sections["sample_pdf_text"] = sample_pdf_text
+            if "input_pdf_text" in used:
+                sections["pdf_text"] = pdf_text
+            fitted_rag, sections, usage = self.token_budget.fit(
+                fixed_tokens, rag_results if "rag_results" in used else [], sections)
+        return (sections.get("pdf_text", pdf_text), sections.get("sample_pdf_text", sample_pdf_text),
+                fitted_rag if "rag_results" in used else rag_results, usage)
+
+    @staticmethod
+    def api_usage(usage) -> dict:
+        """Token counts reported by the API for one completion; also recorded in the token histogram."""
+        if not usage:
+            return {}
+        TOKENS.observe(usage.prompt_tokens, kind="prompt")
+        TOKENS.observe(usage.completion_tokens, kind="completion")
+        return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens,
+                "total_tokens": usage.total_tokens}
+
+    def resolve_rag_results(self, user_query: str, rag_results=None) -> list:
+        """Returns the retrieved chunks, waiting on a pending search or searching now if none was started."""
+        if rag_results is None:
+            return self.search(user_query)
+        if isinstance(rag_results, Future):
+            with timed("rag_wait"):
+                return rag_results.result()
+        return rag_results
 
+    def chat_messages(self, prompt: str) -> list:
+        return [
+            {"role": "system", "content": self.SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def render_prompt(self, user_query: str, pdf_text: str, sample_pdf_text: str, sample_json: str, rag_results: list) -> str:
+        """Renders the prompt through the remote prompt renderer service."""
         # Call the remote render endpoint
         render_data = {
             "user_query": user_query,
             "single_shot_prompt_pdf_text": sample_pdf_text,
             "single_shot_prompt_json": sample_json,
             "input_pdf_text": pdf_text,
-            "rag_results": formatted_rag_results
+            "rag_results": rag_results
         }
         
-        response = requests.post(
-            PROMPT_RENDERER_URL,
-            json=render_data
-        )
-        
-        if response.status_code != 200:
-            raise Exception(f"Render request failed: {response.text}")
-        
-        prompt = response.json()["rendered_prompt"]
-
-        logger.info("Prompt:**********************************\n%s", prompt)
-        logger.info("Prompt:**********************************\n")
-
-        logger.info("Sending prompt to OpenAI:\n%s", prompt)
-
-        response = self.openai_client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an AI interview assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=500
-        )
+        with timed("prompt_render_remote"):
+            prompt = self.service_client.post_json(PROMPT_RENDERER_URL, json=render_data)["rendered_prompt"]
 
-        return response.choices[0].message.content
+        # The full prompt holds the candidate's feedback; keep it out of the default log level
+        logger.info("Sending prompt of %d characters to OpenAI", len(prompt))
+        logger.debug("Prompt:**********************************\n%s", prompt)
+        return prompt
 
 # Example usage
 if __name__ == "__main__":
+    from vectordb import VectorInterviewDb
+    vector_db = VectorInterviewDb("docs/interview_questions.xlsx")
     if vector_db.reindex_needed:
-        vector_db.populate_index()
+        vector_db.populate_index(incremental=True)
     copilot = InterviewCopilot("prompt.jinja2", vector_db)
     user_query = "Extract all programming questions and responses from this interview feedback"
     input_pdf_text = "Artificial Intelligence has transformed various industries."
@@ -0,0 +1,121 @@
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Model loaded once per worker process by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_name, threads):
+    """Loads the embedding model inside a pool worker and caps its intra-op threads."""
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_batch(batch, batch_size):
+    return _worker_model.encode(batch, batch_size=batch_size, convert_to_numpy=True,
+                                show_progress_bar=False).astype(np.float32)
+
+
+def batched(iterable, size):
+    """Yields lists of up to `size` items from any iterable without materializing it."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class EmbeddingPipeline:
+    """
+    Streams text chunks into batched SentenceTransformer.encode calls, either in
+    the current process or sharded across a pool of CPU worker processes, and
+    logs chunks/sec progress while it runs.
+    """
+    def __init__(self, load_model, model_name, batch_size=64, workers=0, progress_interval=5.0, lock=None,
+                 dimension=None):
+        """
+        :param load_model: Function returning the SentenceTransformer used when running in-process; a pooled
+                           pipeline only calls it for the dimension of an empty input when `dimension` is not given.
+        :param model_name: Name the worker processes load their own copy of the model from.
+        :param batch_size: Number of chunks per encode call.
+        :param workers: Number of worker processes; 0 encodes in the current process.
+        :param progress_interval: Seconds between progress log lines.
+        :param lock: Lock held around each in-process encode call, shared with other users of the model.
+        :param dimension: Embedding dimension, if known, returned for an empty input without loading the model.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        self.load_model = load_model
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = workers
+        self.progress_interval = progress_interval
+        self.lock = lock if lock else nullcontext()
+        self.dimension = dimension
+
+    def encode(self, chunks):
+        """
+        Encodes an iterable of chunk strings.
+        :param chunks: Any iterable of strings; consumed lazily one batch at a time.
+        :return: float32 matrix of shape (number of chunks, dimension).
+        """
+        batches = batched(chunks, self.batch_size)
+        results = self._encode_pooled(batches) if self.workers > 0 else self._encode_local(batches)
+
+        encoded = []
+        done = 0
+        started = last_report = time.perf_counter()
+        for embeddings in results:
+            encoded.append(embeddings)
+            done += len(embeddings)
+            now = time.perf_counter()
+            if now - last_report >= self.progress_interval:
+                logger.info("Embedded %d chunks (%.1f chunks/sec)", done, done / (now - started))
+                last_report = now
+
+        elapsed = time.perf_counter() - started
+        logger.info("Embedded %d chunks in %.2fs (%.1f chunks/sec)", done, elapsed, done / elapsed if elapsed else 0.0)
+        if not encoded:
+            dimension = self.dimension if self.dimension else self.load_model().get_sentence_embedding_dimension()
+            return np.zeros((0, dimension), dtype=np.float32)
+        return np.vstack(encoded)
+
+    def _encode_local(self, batches):
+        model = self.load_model()
+        for batch in batches:
+            # Released between batches so concurrent query encodes are not starved during a rebuild
+            with self.lock:
+                embeddings = model.encode(batch, batch_size=self.batch_size, convert_to_numpy=True,
+                                               show_progress_bar=False)
+            yield embeddings.astype(np.float32)
+
+    def _encode_pooled(self, batches):
+        """Keeps a bounded number of batches in flight and yields results in input order."""
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        # spawn, not fork: a forked copy of an already-initialized torch runtime can deadlock
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(self.model_name, threads)) as pool:
+            in_flight = deque()
+            for batch in batches:
+                in_flight.append(pool.submit(_encode_batch, batch, self.batch_size))
+                if len(in_flight) >= self.workers * 2:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
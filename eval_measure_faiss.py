@@ -1,101 +1,299 @@
+import argparse
 import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import faiss
 import numpy as np
 import pandas as pd
-from sentence_transformers import SentenceTransformer
-from vectordb import VectorInterviewDb
+from vectordb import VectorInterviewDb, IndexConfig
+
+# Index configurations compared by ModelEvaluation.benchmark_index_configs
+BENCHMARK_INDEX_CONFIGS = [
+    IndexConfig("flat"),
+    IndexConfig("ivf_flat", nlist=1024, nprobe=8),
+    IndexConfig("ivf_flat", nlist=1024, nprobe=32),
+    IndexConfig("ivf_pq", nlist=1024, nprobe=16, pq_m=16, pq_nbits=8),
+    IndexConfig("hnsw", hnsw_m=32, ef_search=64),
+    IndexConfig("hnsw", hnsw_m=32, ef_search=256),
+]
+
+# Each evaluated model keeps its index and embeddings in its own directory under EVAL_DIR
+EVAL_DIR = "docs/model_eval"
+
+QUERY_IDEAL_RESULTS = {
+    "Find an easy problem related to hash tables.": ["Two Sum", "LRU Cache", "Minimum Window Substring"],
+    "Give me a graph problem that uses DFS.": ["Flood Fill", "Lowest Common Ancestor of a Binary Tree", "Course Schedule"],
+    "I need a linked list problem that involves recursion.": ["Merge Two Sorted Lists", "Add Two Numbers", "Merge k Sorted Lists"],
+    "What is a good problem on binary search?": ["Binary Search"],
+    "Suggest a problem related to topological sorting.": ["3Sum", "Course Schedule", "Alien Dictionary"],
+    "Find a problem that involves implementing a cache.": [],
+    "What is a good example of a two-pointer technique problem?": [],
+    "Give me a problem that is classified under dynamic programming.": ["Regular Expression Matching"],
+    "Show me a problem where heap data structure is used.": ["Kth Largest Element in an Array", "Find Median from Data Stream", "Merge k Sorted Lists"],
+    "I want a problem related to designing a data structure.": ["LRU Cache", "Find Median from Data Stream", "Implement Trie (Prefix Tree)"]
+}
+
+
+def model_index_path(model_name, eval_dir=EVAL_DIR):
+    """Index file of one model; its artifact bundle sits next to it, so models never overwrite each other."""
+    return os.path.join(eval_dir, re.sub(r"[^A-Za-z0-9._-]+", "__", model_name), "faiss_index.bin")
+
+
+def retrieval_metrics(retrieved, ideal, k):
+    """
+    Computes precision, recall, F1, reciprocal rank and nDCG@k for all queries at once.
+    Precision, recall and F1 compare the sets of retrieved and ideal questions; a question
+    retrieved through several chunks counts once, at its best rank.
+    :param retrieved: One list of retrieved question names per query, best match first.
+    :param ideal: One list of relevant question names per query.
+    :param k: Cut-off rank.
+    :return: Dict of metric name to an array with one value per query.
+    """
+    names = {}
+    for row in list(retrieved) + list(ideal):
+        for name in row:
+            names.setdefault(name, len(names))
+    num_queries = len(retrieved)
+
+    # Ranked question ids per query, -1 past the last distinct question
+    ranked = np.full((num_queries, k), -1, dtype=np.int64)
+    for q, row in enumerate(retrieved):
+        distinct = [names[name] for name in dict.fromkeys(row)][:k]
+        ranked[q, :len(distinct)] = distinct
+    relevant = np.zeros((num_queries, max(len(names), 1)), dtype=bool)
+    for q, row in enumerate(ideal):
+        relevant[q, [names[name] for name in row]] = True
+
+    hits = relevant[np.arange(num_queries)[:, np.newaxis], np.maximum(ranked, 0)] & (ranked >= 0)
+    num_hits = hits.sum(axis=1)
+    num_retrieved = (ranked >= 0).sum(axis=1)
+    num_ideal = relevant.sum(axis=1)
+
+    def ratio(numerator, denominator):
+        return np.divide(numerator, denominator, out=np.zeros(num_queries), where=denominator > 0)
+
+    precision = ratio(num_hits, num_retrieved)
+    recall = ratio(num_hits, num_ideal)
+    f1_score = ratio(2 * precision * recall, precision + recall)
+    reciprocal_rank = np.where(hits.any(axis=1), 1.0 / (hits.argmax(axis=1) + 1), 0.0)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    ideal_dcg = np.concatenate([[0.0], np.cumsum(discounts)])[np.minimum(num_ideal, k)]
+    ndcg = ratio(hits @ discounts, ideal_dcg)
+    return {"Precision": precision, "Recall": recall, "F1 Score": f1_score,
+            "Reciprocal Rank": reciprocal_rank, f"nDCG@{k}": ndcg}
+
 
 class ModelEvaluation:
-    def __init__(self, model_name, input_excel="docs/interview_questions.xlsx", top_k=5):
+    def __init__(self, model_name, input_excel="docs/interview_questions.xlsx", top_k=5, index_file_path=None,
+                 chunk_cache=None):
         """
         Initialize the evaluation with a specific embedding model.
+        The model's index is only (re)built when it is missing or out of date, and then
+        incrementally, so unchanged questions are never embedded twice.
         :param model_name: Name of the sentence-transformers model
         :param input_excel: Path to the question database
         :param top_k: Number of results to retrieve
+        :param index_file_path: Index file of this model; defaults to its own path under EVAL_DIR
+        :param chunk_cache: Question text -> chunks shared between models, see VectorInterviewDb
         """
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
         self.top_k = top_k
-        
+        index_file_path = index_file_path if index_file_path else model_index_path(model_name)
+        os.makedirs(os.path.dirname(index_file_path) or ".", exist_ok=True)
+
         # Initialize FAISS index with the given model
-        self.vdb = VectorInterviewDb(input_excel, model=self.model)
-        self.vdb.populate_index()
-        
+        self.vdb = VectorInterviewDb(input_excel, model_name=model_name, index_file_path=index_file_path,
+                                     chunk_cache=chunk_cache)
+        started = time.perf_counter()
+        reason = self.vdb.index_status()
+        self.index_reused = reason is None
+        if reason:
+            print(f"Indexing with {model_name}: {reason}")
+            self.vdb.populate_index(incremental=True)
+        self.index_seconds = time.perf_counter() - started
+
         # Load ideal results for evaluation
-        self.query_ideal_results = {
-            "Find an easy problem related to hash tables.": ["Two Sum", "LRU Cache", "Minimum Window Substring"],
-            "Give me a graph problem that uses DFS.": ["Flood Fill", "Lowest Common Ancestor of a Binary Tree", "Course Schedule"],
-            "I need a linked list problem that involves recursion.": ["Merge Two Sorted Lists", "Add Two Numbers", "Merge k Sorted Lists"],
-            "What is a good problem on binary search?": ["Binary Search"],
-            "Suggest a problem related to topological sorting.": ["3Sum", "Course Schedule", "Alien Dictionary"],
-            "Find a problem that involves implementing a cache.": [],
-            "What is a good example of a two-pointer technique problem?": [],
-            "Give me a problem that is classified under dynamic programming.": ["Regular Expression Matching"],
-            "Show me a problem where heap data structure is used.": ["Kth Largest Element in an Array", "Find Median from Data Stream", "Merge k Sorted Lists"],
-            "I want a problem related to designing a data structure.": ["LRU Cache", "Find Median from Data Stream", "Implement Trie (Prefix Tree)"]
-        }
-
-    def compute_metrics(self, retrieved, ideal):
-        """Compute precision, recall, and F1 score metrics."""
-        ideal_set = set(ideal)
-        retrieved_set = set(retrieved)
-
-        precision = len(retrieved_set & ideal_set) / len(retrieved_set) if retrieved_set else 0
-        recall = len(retrieved_set & ideal_set) / len(ideal_set) if ideal_set else 0
-        f1_score = (2 * precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-
-        return precision, recall, f1_score
+        self.query_ideal_results = dict(QUERY_IDEAL_RESULTS)
+
+    @property
+    def model(self):
+        return self.vdb.model
 
     def evaluate(self):
-        """Evaluate the model's performance on the stored queries."""
-        evaluation_results = []
-        
-        for query, ideal_results in self.query_ideal_results.items():
-            results = self.vdb.search_faiss(query, top_k=self.top_k)
-            
-            if results is not None and not results.empty:
-                retrieved_questions = results["question_summary"].tolist()
-            else:
-                retrieved_questions = []
-
-            precision, recall, f1_score = self.compute_metrics(retrieved_questions, ideal_results)
-
-            evaluation_results.append({
-                "Model": self.model_name,
-                "Query": query,
-                "Retrieved Questions": ", ".join(retrieved_questions),
-                "Ideal Questions": ", ".join(ideal_results),
-                "Precision": precision,
-                "Recall": recall,
-                "F1 Score": f1_score,
-                "Model Name": self.model_name
-            })
-
-        return pd.DataFrame(evaluation_results)
+        """Evaluate the model's performance on the stored queries, searched as one batch."""
+        queries = list(self.query_ideal_results)
+        results = self.vdb.search_many(queries, top_k=self.top_k) or [None] * len(queries)
+        retrieved = [result["question_summary"].tolist() if result is not None and not result.empty else []
+                     for result in results]
+        ideal = [self.query_ideal_results[query] for query in queries]
+
+        evaluation_results = pd.DataFrame({
+            "Model": self.model_name,
+            "Query": queries,
+            "Retrieved Questions": [", ".join(questions) for questions in retrieved],
+            "Ideal Questions": [", ".join(questions) for questions in ideal],
+        })
+        for name, values in retrieval_metrics(retrieved, ideal, self.top_k).items():
+            evaluation_results[name] = values
+        evaluation_results["Model Name"] = self.model_name
+        return evaluation_results
+
+    def benchmark_index_configs(self, configs=BENCHMARK_INDEX_CONFIGS, num_queries=200, k=None, seed=0):
+        """
+        Compares index configurations against exact flat search over this model's embeddings.
+        Queries are the evaluation queries plus a random sample of stored chunk vectors,
+        searched one at a time as /search does.
+        :param configs: IndexConfig instances to compare.
+        :param num_queries: Total number of query vectors.
+        :param k: Neighbours per query; defaults to top_k.
+        :return: DataFrame with recall@k, p50/p99 query latency, index memory and build time per config.
+        """
+        k = k if k else self.top_k
+        embeddings = np.ascontiguousarray(self.vdb.artifacts.load_embeddings(), dtype=np.float32)
+        ids = np.arange(len(embeddings), dtype=np.int64)
+
+        rng = np.random.default_rng(seed)
+        text_queries = self.model.encode(list(self.query_ideal_results), convert_to_numpy=True).astype(np.float32)
+        sample_size = min(max(num_queries - len(text_queries), 0), len(embeddings))
+        sampled = embeddings[rng.choice(len(embeddings), size=sample_size, replace=False)]
+        queries = np.vstack([text_queries, sampled])
+
+        # Ground truth from exact search
+        _, ground_truth = IndexConfig("flat").build(embeddings, ids).search(queries, k)
+
+        benchmark_results = []
+        for config in configs:
+            row = {"Model": self.model_name, "Index Type": config.index_type, "Index Config": json.dumps(config.to_dict())}
+            try:
+                started = time.perf_counter()
+                index = config.build(embeddings, ids)
+                row["Build Seconds"] = time.perf_counter() - started
+
+                latencies = []
+                retrieved = np.empty_like(ground_truth)
+                for i, query in enumerate(queries):
+                    started = time.perf_counter()
+                    _, retrieved[i] = index.search(query[np.newaxis, :], k)
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+                hits = [len(np.intersect1d(found[found >= 0], truth[truth >= 0])) for found, truth in zip(retrieved, ground_truth)]
+                row[f"Recall@{k}"] = float(np.sum(hits) / max(np.sum(ground_truth >= 0), 1))
+                row["p50 ms"] = float(np.percentile(latencies, 50))
+                row["p99 ms"] = float(np.percentile(latencies, 99))
+                row["Index Bytes"] = int(faiss.serialize_index(index).nbytes)
+            except (ValueError, RuntimeError) as e:
+                row["Error"] = str(e)
+            benchmark_results.append(row)
+
+        return pd.DataFrame(benchmark_results)
+
+def _init_eval_worker(threads):
+    """Caps the intra-op threads of each evaluation process so parallel models share the CPU cores."""
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _evaluate_model(model_name, input_excel, index_file_path, top_k, chunk_cache, benchmark_indexes):
+    started = time.perf_counter()
+    evaluator = ModelEvaluation(model_name, input_excel, top_k, index_file_path, chunk_cache)
+    results = evaluator.evaluate()
+    benchmark = evaluator.benchmark_index_configs() if benchmark_indexes else None
+    summary = {"Model": model_name, "Index Reused": evaluator.index_reused,
+               "Index Seconds": evaluator.index_seconds, "Total Seconds": time.perf_counter() - started}
+    return results, benchmark, summary
+
+
+class EvaluationRunner:
+    """
+    Compares several embedding models. The question bank is chunked once and shared by all
+    models, each model keeps its index and embeddings in its own directory under eval_dir
+    (reused by later runs while the sheet and settings are unchanged), and the models are
+    evaluated in parallel worker processes.
+    """
+    def __init__(self, model_names, input_excel="docs/interview_questions.xlsx", eval_dir=EVAL_DIR, top_k=5,
+                 workers=None, benchmark_indexes=True):
+        """
+        :param model_names: sentence-transformers models to compare.
+        :param input_excel: Path to the question database.
+        :param eval_dir: Directory holding one index directory per model.
+        :param top_k: Number of results to retrieve per query.
+        :param workers: Worker processes; defaults to one per model, capped at the CPU count. 1 runs in-process.
+        :param benchmark_indexes: Also run ModelEvaluation.benchmark_index_configs for every model.
+        """
+        self.model_names = list(model_names)
+        self.input_excel = input_excel
+        self.eval_dir = eval_dir
+        self.top_k = top_k
+        self.workers = workers if workers else min(len(self.model_names), os.cpu_count() or 1)
+        self.benchmark_indexes = benchmark_indexes
+
+    def chunk_questions(self):
+        """Splits every question once; the chunking does not depend on the model."""
+        df = pd.read_excel(self.input_excel, usecols=["Question Text"])
+        splitter = VectorInterviewDb(self.input_excel)
+        return {text: splitter.chunk_text(text) for text in dict.fromkeys(df["Question Text"]) if isinstance(text, str)}
+
+    def run(self):
+        """
+        :return: (per-query results, per-model summary, index benchmark) DataFrames; the benchmark is None
+                 when benchmark_indexes is off.
+        """
+        chunk_cache = self.chunk_questions()
+        tasks = [(model_name, self.input_excel, model_index_path(model_name, self.eval_dir), self.top_k, chunk_cache,
+                  self.benchmark_indexes) for model_name in self.model_names]
+        if self.workers <= 1:
+            outcomes = [_evaluate_model(*task) for task in tasks]
+        else:
+            threads = max(1, (os.cpu_count() or 1) // self.workers)
+            # Spawned workers start without the parent's torch state and load only their own model
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_eval_worker, initargs=(threads,)) as pool:
+                futures = [pool.submit(_evaluate_model, *task) for task in tasks]
+                outcomes = [future.result() for future in futures]
+
+        results = pd.concat([result for result, _, _ in outcomes], ignore_index=True)
+        metrics = [column for column in results.columns if column not in ("Model", "Query", "Retrieved Questions",
+                                                                           "Ideal Questions", "Model Name")]
+        summary = pd.DataFrame([info for _, _, info in outcomes]).merge(
+            results.groupby("Model", sort=False)[metrics].mean().reset_index(), on="Model")
+        benchmark = pd.concat([result for _, result, _ in outcomes], ignore_index=True) if self.benchmark_indexes else None
+        return results, summary, benchmark
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare embedding models on the evaluation queries.")
     # Test with different models
-    models_to_test = ["all-MiniLM-L6-v2", "all-mpnet-base-v2", "multi-qa-mpnet-base-dot-v1"]
-    
-    all_results = []
-    f1_scores = {}
-    for model_name in models_to_test:
-        evaluator = ModelEvaluation(model_name)
-        model_results = evaluator.evaluate()
-        all_results.append(model_results)
-        
-        # Compute average F1 score for the model
-        avg_f1 = model_results["F1 Score"].mean()
-        f1_scores[model_name] = avg_f1
-    
-    # Combine all results into a single DataFrame
-    final_results = pd.concat(all_results, ignore_index=True)
-    
-    # Save results to an Excel file
+    parser.add_argument("models", nargs="*",
+                        default=["all-MiniLM-L6-v2", "all-mpnet-base-v2", "multi-qa-mpnet-base-dot-v1"],
+                        help="sentence-transformers models to compare")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Worker processes (default: one per model, up to the CPU count)")
+    parser.add_argument("-k", "--top-k", type=int, default=5, help="Results retrieved per query")
+    parser.add_argument("--eval-dir", default=EVAL_DIR, help=f"Per-model index directory (default: {EVAL_DIR})")
+    parser.add_argument("--skip-index-benchmark", action="store_true", help="Skip the index type comparison")
+    args = parser.parse_args()
+
+    runner = EvaluationRunner(args.models, eval_dir=args.eval_dir, top_k=args.top_k, workers=args.workers,
+                              benchmark_indexes=not args.skip_index_benchmark)
+    final_results, summary, benchmark = runner.run()
+
+    # Save per-query results and the per-model averages to an Excel file
     output_file = "docs/model_comparison_results.xlsx"
-    final_results.to_excel(output_file, index=False)
-    
+    with pd.ExcelWriter(output_file) as writer:
+        final_results.to_excel(writer, sheet_name="Results", index=False)
+        summary.to_excel(writer, sheet_name="Summary", index=False)
     print(f"Evaluation results saved to {output_file}")
-    
-    # Print the F1 scores for each model
-    for model, score in f1_scores.items():
-        print(f"Model: {model}, Average F1 Score: {score:.4f}")
+
+    # Save the recall/latency/memory comparison of index types
+    if benchmark is not None:
+        benchmark_file = "docs/index_benchmark_results.xlsx"
+        benchmark.to_excel(benchmark_file, index=False)
+        print(f"Index benchmark results saved to {benchmark_file}")
+
+    # Print the scores for each model
+    for _, row in summary.iterrows():
+        print(f"Model: {row['Model']}, Average F1 Score: {row['F1 Score']:.4f}, MRR: {row['Reciprocal Rank']:.4f}, "
+              f"nDCG@{args.top_k}: {row[f'nDCG@{args.top_k}']:.4f}, index {'reused' if row['Index Reused'] else 'built'}")
@@ -0,0 +1,67 @@
+"""
+Synthetic interview feedback PDFs in the layout pdf_to_json expects, generated without a PDF
+library or sample documents; shared by benchmark.py and the tests.
+"""
+import random
+
+FEEDBACK_SECTIONS = ["1st Interview", "2nd Interview", "3rd Interview", "4th Interview", "5th Interview"]
+FEEDBACK_SENTENCES = [
+    "The candidate solved two sum with a hash map and explained the trade-offs clearly.",
+    "Struggled to recognise that the graph needed a depth-first search with cycle detection.",
+    "Wrote a clean recursive solution for merging two sorted linked lists.",
+    "Needed hints to apply binary search on the answer space.",
+    "Designed an LRU cache with a dictionary and a doubly linked list.",
+    "Used two pointers to find a pair with the target sum in linear time.",
+    "Identified the overlapping subproblems but did not finish the dynamic programming table.",
+    "Kept the k largest elements in a min-heap and analysed the complexity correctly.",
+    "Communicated the approach well before writing code and tested edge cases.",
+    "Missed the empty input case and an off-by-one error in the loop bounds.",
+]
+
+
+def synthetic_feedback(seed, sentences_per_section=12):
+    """
+    Builds interview feedback text in the layout pdf_to_json expects: a table of contents,
+    then one block per interview, then the personality traits section.
+    :return: List of pages, each a list of text lines.
+    """
+    rng = random.Random(seed)
+    pages = [["Contents"] + FEEDBACK_SECTIONS + ["Personality Traits"]]
+    for section in FEEDBACK_SECTIONS:
+        pages.append([section] + [rng.choice(FEEDBACK_SENTENCES) for _ in range(sentences_per_section)])
+    pages.append(["Personality Traits", rng.choice(FEEDBACK_SENTENCES)])
+    return pages
+
+
+def synthetic_pdf(pages):
+    """
+    Writes text pages into a minimal single-font PDF, so the benchmark needs no PDF library
+    and no sample documents.
+    :param pages: List of pages, each a list of text lines.
+    :return: PDF file content as bytes.
+    """
+    def escape(line):
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        content = "\n".join(["BT", "/F1 11 Tf", "14 TL", "72 760 Td"] +
+                            [f"({escape(line)}) Tj T*" for line in lines] + ["ET"]).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{kid} 0 R" for kid in kids).encode(),
+                                                              len(kids))
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
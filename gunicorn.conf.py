@@ -0,0 +1,40 @@
+"""
+Production serving settings shared by all ws_* services, e.g.
+
+    PORT=5000 gunicorn -c gunicorn.conf.py ws_vsearch:app
+
+The app is imported once in the master process (preload_app), so the embedding
+model and the FAISS index are loaded a single time and shared copy-on-write by
+the forked workers. Each worker serves requests on a small thread pool.
+"""
+import multiprocessing
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+preload_app = True
+# LLM calls and streamed responses can legitimately take minutes
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 300))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+# Services load their models while the app is preloaded, before the workers fork
+os.environ.setdefault("SERVICE_WARM_UP", "preload")
+# Lets the services size their own process pools to their share of the cores
+os.environ.setdefault("WEB_CONCURRENCY", str(workers))
+
+
+def post_fork(server, worker):
+    """Splits the CPU cores between workers so their inference thread pools do not oversubscribe the machine."""
+    torch = sys.modules.get("torch")
+    if torch is None:  # services without a model never import it
+        return
+    torch_threads = max(1, multiprocessing.cpu_count() // workers)
+    torch.set_num_threads(torch_threads)
+    server.log.info("Worker %s using %d torch threads", worker.pid, torch_threads)
@@ -92,7 +92,7 @@ start_service() {
     echo -e "${GREEN}Starting $service...${NC}"
     echo "[$(date)] Starting $service" >> "$LOG_FILE"
     # Use bash -c to properly handle source and environment variables
-    bash -c "source $VENV_PATH/bin/activate && python3 $service" < /dev/null >> "$LOG_FILE" 2>&1 &
+    FLASK_DEBUG="${FLASK_DEBUG:-1}" bash -c "source $VENV_PATH/bin/activate && python3 $service" < /dev/null >> "$LOG_FILE" 2>&1 &
     echo $! > "$pid_file"
     sleep 2
     if ps -p $(cat "$pid_file") > /dev/null; then
@@ -0,0 +1,201 @@
+import bisect
+import contextvars
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Incoming ids end up in logs and profile file names, so only plain tokens are accepted
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,128}")
+# Latency buckets in seconds, from sub-millisecond cache hits to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 131072)
+
+# Request id of the request being served by the current thread or context
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+
+class Registry:
+    """Collects the metrics of this process and renders them in the Prometheus text format."""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels."""
+    TYPE = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, optionally split by labels."""
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if position < len(self.buckets):
+                entry[0][position] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall-clock seconds spent inside the with block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{float(bound)!r}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [le])} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [le])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# Hot-path stages shared by all services: pdf_parse, pdf_split, encode, faiss_search, prompt_render, llm, ...
+STAGE_SECONDS = Histogram("interview_eval_stage_seconds", "Latency of hot-path stages in seconds", ["stage"])
+TOKENS = Histogram("interview_eval_tokens", "Tokens per LLM request", ["kind"], buckets=TOKEN_BUCKETS)
+REQUEST_SECONDS = Histogram("interview_eval_http_request_seconds", "HTTP request latency in seconds",
+                            ["service", "endpoint", "method", "status"])
+REQUESTS = Counter("interview_eval_http_requests_total", "HTTP requests served",
+                   ["service", "endpoint", "method", "status"])
+
+
+def timed(stage):
+    """Context manager timing one hot-path stage into interview_eval_stage_seconds."""
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def current_request_id():
+    return request_id_var.get()
+
+
+def install_metrics(app, service):
+    """
+    Instruments a Flask app: per-endpoint latency and request counters, a /metrics endpoint
+    in the Prometheus text format, X-Request-ID propagation (taken from the caller or generated,
+    echoed on the response, and forwarded by ServiceClient), and opt-in profiling of a random
+    sample of requests (PROFILE_SAMPLE_RATE, written as .prof files to PROFILE_DIR).
+    Each process keeps its own metrics, so under several server workers a scrape reports one worker.
+    :param app: Flask application.
+    :param service: Service name used as a metric label and in profile file names.
+    """
+    from flask import Response, g, request
+
+    sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    profile_dir = os.getenv("PROFILE_DIR", "profiles")
+
+    @app.before_request
+    def start_request():
+        request_id = request.headers.get(REQUEST_ID_HEADER, "")
+        if not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_id = request_id
+        g.request_id_token = request_id_var.set(request_id)
+        g.request_started = time.perf_counter()
+        g.profiler = None
+        if sample_rate and random.random() < sample_rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                g.profiler = profiler
+            except ValueError:
+                pass  # another request's profiler is active; only one can run per process
+
+    @app.after_request
+    def finish_request(response):
+        if getattr(g, "profiler", None) is not None:
+            g.profiler.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            g.profiler.dump_stats(os.path.join(profile_dir, f"{service}-{g.request_id}.prof"))
+        if hasattr(g, "request_started"):
+            labels = {"service": service, "endpoint": request.url_rule.rule if request.url_rule else "unmatched",
+                      "method": request.method, "status": str(response.status_code)}
+            REQUEST_SECONDS.observe(time.perf_counter() - g.request_started, **labels)
+            REQUESTS.inc(**labels)
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
+
+    @app.teardown_request
+    def reset_request_id(exc):
+        token = g.pop("request_id_token", None)
+        if token is not None:
+            request_id_var.reset(token)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """
+        Endpoint exposing this process's metrics in the Prometheus text format.
+        """
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
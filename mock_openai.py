@@ -0,0 +1,124 @@
+"""
+Local stand-in for the OpenAI chat completions API, for benchmarks and offline runs.
+Point the copilot at it with OPENAI_BASE_URL, e.g.
+
+    PORT=5010 gunicorn -c gunicorn.conf.py mock_openai:app
+    OPENAI_BASE_URL=http://localhost:5010/v1 OPENAI_API_KEY=mock python ws_interview_copilot.py
+
+The latency of a completion is MOCK_OPENAI_LATENCY_MS before the first token plus
+MOCK_OPENAI_TOKEN_MS per generated token, with MOCK_OPENAI_JITTER (a fraction) of random
+variation; MOCK_OPENAI_COMPLETION_TOKENS sets the response length (capped by max_tokens).
+"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from flask import Flask, Response, jsonify, request
+
+LATENCY_MS = float(os.getenv("MOCK_OPENAI_LATENCY_MS", 400))
+TOKEN_MS = float(os.getenv("MOCK_OPENAI_TOKEN_MS", 10))
+JITTER = float(os.getenv("MOCK_OPENAI_JITTER", 0.1))
+COMPLETION_TOKENS = int(os.getenv("MOCK_OPENAI_COMPLETION_TOKENS", 120))
+# The copilot prompts the model for interview questions as JSON; answer in the same shape
+RESPONSE_WORDS = json.dumps({"questions": [{"question": "Walk me through how you would design an LRU cache.",
+                                            "difficulty": "Medium", "level": "Senior"}]}).split(" ")
+
+app = Flask(__name__)
+stats_lock = threading.Lock()
+stats = {"requests": 0, "streamed": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def delay(milliseconds):
+    """Sleeps for milliseconds, varied by +/- JITTER."""
+    if milliseconds > 0:
+        time.sleep(milliseconds * random.uniform(1 - JITTER, 1 + JITTER) / 1000.0)
+
+
+def completion_tokens(max_tokens):
+    """The words of the canned response, repeated up to the response length; one word counts as one token."""
+    count = min(COMPLETION_TOKENS, max_tokens) if max_tokens else COMPLETION_TOKENS
+    return [RESPONSE_WORDS[i % len(RESPONSE_WORDS)] + " " for i in range(count)]
+
+
+def usage(messages, tokens):
+    # Roughly four characters per token, close enough for load testing
+    prompt_tokens = sum(len(message.get("content") or "") for message in messages) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens)}
+
+
+def record(streamed, report):
+    with stats_lock:
+        stats["requests"] += 1
+        stats["streamed"] += int(streamed)
+        stats["prompt_tokens"] += report["prompt_tokens"]
+        stats["completion_tokens"] += report["completion_tokens"]
+
+
+@app.route("/health", methods=["GET"])
+def health():
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route("/stats", methods=["GET"])
+def get_stats():
+    """
+    Endpoint reporting the requests served and the configured latency.
+    """
+    with stats_lock:
+        return jsonify(dict(stats, latency_ms=LATENCY_MS, token_ms=TOKEN_MS, jitter=JITTER,
+                            completion_tokens_per_response=COMPLETION_TOKENS)), 200
+
+
+@app.route("/v1/chat/completions", methods=["POST"])
+def chat_completions():
+    """
+    Endpoint mimicking POST /v1/chat/completions, with or without stream=true.
+    """
+    body = request.get_json(silent=True) or {}
+    messages = body.get("messages") or []
+    model = body.get("model", "gpt-4")
+    tokens = completion_tokens(body.get("max_tokens"))
+    report = usage(messages, tokens)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    record(body.get("stream", False), report)
+
+    if not body.get("stream", False):
+        delay(LATENCY_MS + TOKEN_MS * len(tokens))
+        return jsonify({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "".join(tokens)}}],
+            "usage": report,
+        }), 200
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def chunk(delta, finish_reason=None, **extra):
+        payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                   "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None
+                   else [], **extra}
+        return f"data: {json.dumps(payload)}\n\n"
+
+    def stream():
+        delay(LATENCY_MS)
+        yield chunk({"role": "assistant", "content": ""})
+        for token in tokens:
+            delay(TOKEN_MS)
+            yield chunk({"content": token})
+        yield chunk({}, finish_reason="stop")
+        if include_usage:
+            yield chunk(None, usage=report)
+        yield "data: [DONE]\n\n"
+
+    return Response(stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", 5010)), threaded=True)
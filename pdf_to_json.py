@@ -1,20 +1,186 @@
 from pypdf import PdfReader
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from cache import LRUCache
+from metrics import timed
+import multiprocessing
+import threading
+import tempfile
+import uuid
+import argparse
+import sys
+import time
+import hashlib
+import bisect
+import re
 import glob
 import json
+import io
+import os
+
+# PDFs with at least this many pages are split across the worker pool
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", 32))
+# Every server worker has its own pool, so by default the cores are split between them (see gunicorn.conf.py)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", 1)))))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """Returns the process-wide page extraction pool, recreating it after a fork."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def _extract_pages(path, start, stop):
+    """Extracts the text of pages [start, stop) from a PDF file; runs in pool workers."""
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+class SectionTemplate:
+    """
+    Headings that delimit the sections of a feedback PDF. Each section runs from the
+    given occurrence of its heading (the first occurrence is usually the table of
+    contents) to the next occurrence of the following heading, the last one ending
+    at end_section.
+    """
+    def __init__(self, sections, end_section, occurrence=2):
+        self.sections = list(sections)
+        self.end_section = end_section
+        self.occurrence = occurrence
+        headings = set(self.sections) | {end_section}
+        # Longest first, so a heading that is a prefix of another never shadows it
+        self.pattern = re.compile("|".join(re.escape(h) for h in sorted(headings, key=len, reverse=True)))
+
+    def split(self, text):
+        """
+        Finds all headings in a single scan of the text.
+        :return: List of {"interview": heading, "content": text or None}.
+        """
+        positions = {}
+        for match in self.pattern.finditer(text):
+            positions.setdefault(match.group(), []).append(match.start())
+
+        data = []
+        for i, current_section in enumerate(self.sections):
+            next_section = self.sections[i + 1] if i < len(self.sections) - 1 else self.end_section
+            content = None
+            starts = positions.get(current_section, [])
+            if len(starts) >= self.occurrence:
+                start_idx = starts[self.occurrence - 1] + len(current_section)
+                ends = positions.get(next_section, [])
+                end_pos = bisect.bisect_left(ends, start_idx)
+                if end_pos < len(ends):
+                    content = text[start_idx:ends[end_pos]].strip()
+            data.append({"interview": current_section, "content": content})
+        return data
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(config["sections"], config["end_section"], config.get("occurrence", 2))
+
+
+SECTION_TEMPLATES = {
+    "default": SectionTemplate(["1st Interview", "2nd Interview", "3rd Interview", "4th Interview", "5th Interview"],
+                               "Personality Traits"),
+}
+
+# Extra templates: a JSON file mapping names to {"sections": [...], "end_section": ..., "occurrence": 2}
+if os.getenv("PDF_SECTION_TEMPLATES_FILE"):
+    with open(os.environ["PDF_SECTION_TEMPLATES_FILE"], "r") as file:
+        SECTION_TEMPLATES.update({name: SectionTemplate.from_dict(config) for name, config in json.load(file).items()})
+
 
 class PDFTextExtractor:
-    def __init__(self, pdf_path):
-        """Initializes the extractor with a given PDF file path."""
+    # Extracted text keyed by the SHA-256 of the PDF bytes, shared by every extractor in the process
+    text_cache = LRUCache(maxsize=int(os.getenv("PDF_CACHE_SIZE", 256)))
+
+    def __init__(self, pdf_path, parallel=True):
+        """
+        Initializes the extractor with a PDF file path, the PDF bytes or a seekable binary file object.
+        :param parallel: Split large PDFs across the worker pool.
+        """
         self.pdf_path = pdf_path
+        self.parallel = parallel
+        self.error = None  # set when extraction fails; text then holds the error message
+        self.sha256 = None  # content hash, set once the PDF has been read
         self.text = self._extract_text()
+
+    def _open_source(self):
+        """Returns a path or a seekable binary stream for the PDF."""
+        if isinstance(self.pdf_path, (bytes, bytearray)):
+            return io.BytesIO(self.pdf_path)
+        if hasattr(self.pdf_path, "read"):
+            self.pdf_path.seek(0)
+            return self.pdf_path
+        return self.pdf_path
+
+    @staticmethod
+    def content_hash(source):
+        """SHA-256 of the PDF contents, read in blocks from a path or a seekable stream."""
+        digest = hashlib.sha256()
+        f = open(source, "rb") if isinstance(source, str) else source
+        try:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        finally:
+            if f is source:
+                f.seek(0)
+            else:
+                f.close()
+        return digest.hexdigest()
     
     def _extract_text(self):
-        """Extracts text from the PDF file."""
+        """Extracts text from the PDF file, extracting every page exactly once."""
         try:
-            reader = PdfReader(self.pdf_path)
-            return "\n".join([page.extract_text() for page in reader.pages if page.extract_text()])
+            source = self._open_source()
+            digest = self.sha256 = self.content_hash(source)
+            cached = self.text_cache.get(digest)
+            if cached is not None:
+                return cached
+
+            with timed("pdf_parse"):
+                reader = PdfReader(source)
+                num_pages = len(reader.pages)
+                if self.parallel and PDF_WORKERS > 1 and num_pages >= PARALLEL_PAGE_THRESHOLD:
+                    texts = self._extract_parallel(source, num_pages)
+                else:
+                    texts = [page.extract_text() for page in reader.pages]
+
+            text = "\n".join([page_text for page_text in texts if page_text])
+            self.text_cache.set(digest, text)
+            return text
         except Exception as e:
+            self.error = e
             return f"Error extracting text from PDF: {e}"
+
+    def _extract_parallel(self, source, num_pages):
+        """Extracts contiguous page ranges in worker processes and reassembles them in order."""
+        tmp_path = None
+        if not isinstance(source, str):
+            # Workers cannot share our file object; write it once instead of pickling the bytes into every task
+            source.seek(0)
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+                for block in iter(lambda: source.read(1 << 20), b""):
+                    f.write(block)
+            source.seek(0)
+            tmp_path = source = f.name
+        try:
+            step = -(-num_pages // PDF_WORKERS)  # ceil division
+            pool = _get_pool()
+            futures = [pool.submit(_extract_pages, source, start, min(start + step, num_pages))
+                       for start in range(0, num_pages, step)]
+            return [page_text for future in futures for page_text in future.result()]
+        finally:
+            if tmp_path:
+                os.remove(tmp_path)
     
     def extract_text_between(self, start_str, end_str):
         """Extracts text between the second occurrence of start_str and the next occurrence of end_str."""
@@ -33,49 +199,308 @@ class PDFTextExtractor:
         
         return self.text[start_idx:end_idx].strip()
     
-    def get_json_feedback(self):
+    def get_feedback(self, template="default"):
+        """
+        Extracts interview feedback sections in one pass over the text.
+        :param template: Name in SECTION_TEMPLATES or a SectionTemplate.
+        :return: List of {"interview": ..., "content": ...} dicts.
+        """
+        if not isinstance(template, SectionTemplate):
+            if template not in SECTION_TEMPLATES:
+                raise KeyError(f"Unknown section template: {template}")
+            template = SECTION_TEMPLATES[template]
+        with timed("pdf_split"):
+            return template.split(self.text)
+
+    def get_json_feedback(self, template="default"):
         """Extracts interview feedback sections and returns them as JSON."""
-        sections = ["1st Interview", "2nd Interview", "3rd Interview", "4th Interview", "5th Interview"]
-        end_section = "Personality Traits"
-        data = []
-        
-        for i in range(len(sections)):
-            current_section = sections[i]
-            next_section = sections[i + 1] if i < len(sections) - 1 else end_section
-            content = self.extract_text_between(current_section, next_section)
-            data.append({"interview": sections[i], "content": content})
-        
-        return json.dumps(data, indent=4)
+        return json.dumps(self.get_feedback(template), indent=4)
+
+def iter_pdf_paths(inputs):
+    """Expands directories (recursively) and glob patterns into a sorted, de-duplicated list of PDF paths."""
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, "**", "*.pdf"), recursive=True))
+        else:
+            paths.update(glob.glob(pattern, recursive=True))
+    return sorted(paths)
 
-# Example Usage:
-# extractor = PDFTextExtractor("path/to/pdf.pdf")
-# feedback_json = extractor.get_json_feedback()
-# print(feedback_json)
+
+def file_fingerprint(path):
+    """(size, mtime_ns) of a file, compared against the manifest before a file is read at all."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _ingest_file(path, template):
+    """Hashes and extracts the sections of one PDF; runs in ingestion worker processes."""
+    started = time.perf_counter()
+    record = {"path": path, "sha256": None, "size": None, "mtime_ns": None, "sections": None, "seconds": None,
+              "error": None}
+    try:
+        record["size"], record["mtime_ns"] = file_fingerprint(path)
+        # Page-level parallelism stays off: the files themselves are already spread over the pool
+        extractor = PDFTextExtractor(path, parallel=False)
+        record["sha256"] = extractor.sha256
+        if extractor.error is not None:
+            raise extractor.error
+        record["sections"] = extractor.get_feedback(template)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = time.perf_counter() - started
+    return record
+
+
+class IngestionManifest:
+    """
+    Append-only JSON-lines log of ingested PDFs. A file whose path, size and mtime are listed is
+    skipped on later runs without being read; one whose content hash is listed is skipped once hashed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.hashes = set()
+        self.fingerprints = set()
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.hashes.add(entry["sha256"])
+                        if "size" in entry:
+                            self.fingerprints.add((entry["path"], entry["size"], entry["mtime_ns"]))
+        self._file = open(path, "a") if path else None
+
+    def __contains__(self, sha256):
+        return sha256 in self.hashes
+
+    def seen(self, path, size, mtime_ns):
+        return (path, size, mtime_ns) in self.fingerprints
+
+    def record(self, path, sha256, size=None, mtime_ns=None):
+        self.hashes.add(sha256)
+        if size is not None:
+            self.fingerprints.add((path, size, mtime_ns))
+        if self._file:
+            self._file.write(json.dumps({"sha256": sha256, "path": path, "size": size, "mtime_ns": mtime_ns,
+                                         "ingested_at": time.time()}) + "\n")
+            self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+
+class NdjsonWriter:
+    """Writes one JSON object per line, flushed after every record."""
+    def __init__(self, path, on_written=None):
+        """
+        :param on_written: Called with each record once it is in the output, e.g. to record it in the manifest.
+        """
+        self.path = path
+        if path != "-":
+            self._drop_partial_line()
+        self._file = sys.stdout if path == "-" else open(path, "a")
+        self.on_written = on_written
+
+    def _drop_partial_line(self):
+        """Truncates a record cut short by a crash; it never reached the manifest, so it is ingested again."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            position = f.seek(0, os.SEEK_END)
+            if position == 0:
+                return
+            f.seek(position - 1)
+            if f.read(1) == b"\n":
+                return
+            while position > 0:
+                step = min(1 << 16, position)
+                position -= step
+                f.seek(position)
+                newline = f.read(step).rfind(b"\n")
+                if newline != -1:
+                    f.truncate(position + newline + 1)
+                    return
+            f.truncate(0)
+
+    def written_hashes(self):
+        """
+        Hashes of records that may be missing from the manifest: a crash between writing a record and
+        recording it can only affect the last line, so only that line is read.
+        """
+        if self.path == "-" or not os.path.exists(self.path):
+            return set()
+        with open(self.path, "rb") as f:
+            position = f.seek(0, os.SEEK_END)
+            tail = b""
+            while position > 0 and tail.count(b"\n") < 2:
+                step = min(1 << 16, position)
+                position -= step
+                f.seek(position)
+                tail = f.read(step) + tail
+        lines = tail.rstrip(b"\n").rsplit(b"\n", 1)
+        return {json.loads(lines[-1])["sha256"]} if lines[-1] else set()
+
+    def write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        if self.on_written:
+            self.on_written(record)
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class ParquetFeedbackWriter:
+    """
+    Writes records to a Parquet dataset directory, one part file per `batch_size` records.
+    Each part is written under a temporary name and renamed into place, and its records are
+    only reported to on_written after that, so an interrupted run resumes into the same
+    directory without losing or duplicating rows. Read it back with pandas.read_parquet(path).
+    """
+    def __init__(self, path, batch_size=256, on_written=None):
+        """
+        :param path: Output directory; created if missing, existing part files are kept.
+        :param batch_size: Records per part file.
+        :param on_written: Called with each record once its part file is complete.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if os.path.isfile(path):
+            raise FileExistsError(f"{path} is a file; Parquet output is written as a directory of part files")
+        os.makedirs(path, exist_ok=True)
+        self._pa = pa
+        self._pq = pq
+        section = pa.struct([("interview", pa.string()), ("content", pa.string())])
+        self.schema = pa.schema([("path", pa.string()), ("sha256", pa.string()),
+                                 ("sections", pa.list_(section)), ("seconds", pa.float64())])
+        self.path = path
+        self.batch_size = batch_size
+        self.on_written = on_written
+        # Unique per writer, so the parts of a resumed run never replace earlier ones
+        self._run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex}"
+        self._parts = 0
+        self._pending = []
+
+    def written_hashes(self):
+        """Hashes of every record in the existing part files; a crash right after a rename leaves them out of the manifest."""
+        parts = [name for name in os.listdir(self.path) if name.startswith("part-") and name.endswith(".parquet")]
+        if not parts:
+            return set()
+        return set(self._pq.read_table(self.path, columns=["sha256"]).column("sha256").to_pylist())
+
+    def write(self, record):
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        table = self._pa.Table.from_pylist([{name: record[name] for name in self.schema.names}
+                                            for record in self._pending], schema=self.schema)
+        part_path = os.path.join(self.path, f"part-{self._run_id}-{self._parts:05d}.parquet")
+        # Dot-prefixed, so readers of the dataset skip a part that is still being written
+        tmp_path = os.path.join(self.path, f".{os.path.basename(part_path)}.tmp")
+        self._pq.write_table(table, tmp_path)
+        os.replace(tmp_path, part_path)
+        self._parts += 1
+        records, self._pending = self._pending, []
+        if self.on_written:
+            for record in records:
+                self.on_written(record)
+
+    def close(self):
+        self.flush()
+
+
+def ingest(inputs, output="-", manifest_path=None, workers=None, template="default", log=None, batch_size=256):
+    """
+    Extracts feedback sections from many PDFs in a process pool and writes them incrementally.
+    :param inputs: Directories, files or glob patterns.
+    :param output: NDJSON file ("-" for stdout) or a .parquet directory of part files.
+    :param manifest_path: JSON-lines manifest of processed files used to resume; None disables it.
+    :param workers: Number of worker processes; defaults to the CPU count.
+    :param template: Section template name (see SECTION_TEMPLATES).
+    :param log: Callable receiving progress lines; defaults to printing to stderr.
+    :param batch_size: Records per Parquet part file.
+    :return: Summary dict with counts, failures and timing.
+    """
+    log = log if log else (lambda line: print(line, file=sys.stderr))
+    if template not in SECTION_TEMPLATES:
+        raise KeyError(f"Unknown section template: {template}")
+
+    manifest = IngestionManifest(manifest_path)
+    paths = iter_pdf_paths(inputs)
+    # Only a stat call per file here; the workers read and hash the files that still need it
+    pending = [path for path in paths if not manifest.seen(path, *file_fingerprint(path))]
+    skipped = len(paths) - len(pending)
+    log(f"Found {len(paths)} PDFs: {len(pending)} to ingest, {skipped} skipped as already ingested")
+
+    failures = []
+    ingested = 0
+
+    def written(record):
+        nonlocal ingested
+        # Only recorded once the output is written, so a crash never loses a file
+        manifest.record(record["path"], record["sha256"], record["size"], record["mtime_ns"])
+        ingested += 1
+
+    writer = (ParquetFeedbackWriter(output, batch_size, on_written=written) if output.endswith(".parquet")
+              else NdjsonWriter(output, on_written=written))
+    # Content already in the output, including records a crash kept out of the manifest, and identical copies
+    # found earlier in this run
+    recovered = writer.written_hashes() - manifest.hashes
+    claimed = manifest.hashes | recovered
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers if workers else os.cpu_count(),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_ingest_file, path, template) for path in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                if record["error"]:
+                    failures.append({"path": record["path"], "error": record["error"]})
+                    log(f"[failed] {record['path']} ({record['seconds']:.2f}s): {record['error']}")
+                    continue
+                if record["sha256"] in claimed:
+                    # Remember the path, so the next run skips it without reading it; a copy still
+                    # buffered by the writer is not durable yet and is only recorded with the original
+                    if record["sha256"] in manifest or record["sha256"] in recovered:
+                        manifest.record(record["path"], record["sha256"], record["size"], record["mtime_ns"])
+                    skipped += 1
+                    log(f"[skipped] {record['path']}: content already ingested")
+                    continue
+                claimed.add(record["sha256"])
+                writer.write(record)
+                log(f"[ok] {record['path']} ({record['seconds']:.2f}s)")
+    finally:
+        writer.close()
+        manifest.close()
+
+    elapsed = time.perf_counter() - started
+    summary = {"found": len(paths), "ingested": ingested, "skipped": skipped, "failed": len(failures),
+               "failures": failures, "seconds": elapsed, "files_per_second": ingested / elapsed if elapsed else 0.0}
+    log(f"Ingested {ingested} PDFs in {elapsed:.2f}s ({summary['files_per_second']:.1f} files/sec), "
+        f"{skipped} skipped, {len(failures)} failed")
+    return summary
 
 
 if __name__ == "__main__":
-    for file_path in glob.glob("docs/training data/candidate[3]*.pdf"):  # Matches candidate1.pdf, candidate2.pdf, etc.
-    #     print(file_path) # Prints the filename (e.g., candidate1.pdf)
-        extractor = PDFTextExtractor(file_path)
-        print(extractor.get_json_feedback())
-        # feedback_json = extractor.get_json_feedback()
-        # print(feedback_json)
-
-    # sections = ["1st Interview", "2nd Interview", "3rd Interview", "4th Interview", "5th Interview"]
-    # end_section = "Personality Traits"
-    # data = []
-    # # for file_path in glob.glob("candidate[1-9]*.pdf"):  # Matches candidate1.pdf, candidate2.pdf, etc.
-    # for file_path in glob.glob("docs/training data/candidate[1]*.pdf"):  # Matches candidate1.pdf, candidate2.pdf, etc.
-    #     print(file_path) # Prints the filename (e.g., candidate1.pdf)
-    #     pdf_path = os.path.join(".", file_path)
-    #     text = extract_text_from_pdf(pdf_path)
-    #     print(f"Extracted text from {pdf_path}")
-    #     # Extract content between sections with automatic font size detection
-    #     for i in range(len(sections)):
-    #         current_section = sections[i]
-    #         next_section = sections[i + 1] if i < len(sections) - 1 else end_section
-    #         content = extract_text_between(text, current_section, next_section)
-    #         data.append({"interview":sections[i], "content":content})
-
-    #     json_data = json.dumps(data, indent=4)
-    #     print(json_data)
+    parser = argparse.ArgumentParser(description="Extract interview feedback sections from PDFs in bulk.")
+    parser.add_argument("inputs", nargs="*", default=["docs/training data"],
+                        help="Directories, PDF files or glob patterns (default: docs/training data)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="NDJSON output file, '-' for stdout, or a .parquet directory of part files")
+    parser.add_argument("-m", "--manifest",
+                        help="Manifest of processed content hashes for resuming (default: <output>.manifest.jsonl)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("-t", "--template", default="default", choices=sorted(SECTION_TEMPLATES),
+                        help="Section template")
+    args = parser.parse_args()
+
+    manifest_path = args.manifest if args.manifest else (f"{args.output}.manifest.jsonl" if args.output != "-" else None)
+    summary = ingest(args.inputs, args.output, manifest_path, args.workers, args.template)
+    sys.exit(1 if summary["failed"] else 0)
@@ -1,22 +1,109 @@
-from jinja2 import Template
 import json
 import logging
+import os
+from functools import lru_cache
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateNotFound, meta
+from metrics import timed
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+TEMPLATE_DIR = os.getenv("PROMPT_TEMPLATE_DIR", ".")
+DEFAULT_TEMPLATE = "prompt.jinja2"
+# Templates a caller may ask for by name, e.g. PROMPT_TEMPLATES=prompt.jinja2,prompt_short.jinja2; the template
+# directory also holds code and configuration, so no other file is ever loaded by a requested name
+ALLOWED_TEMPLATES = frozenset(name.strip() for name in os.getenv("PROMPT_TEMPLATES", DEFAULT_TEMPLATE).split(",")
+                              if name.strip())
+
+
+@lru_cache(maxsize=32)
+def parse_single_shot_json(single_shot_prompt_json: str) -> dict:
+    """Parses the single-shot example JSON once per distinct string; callers must not mutate the result."""
+    try:
+        return json.loads(single_shot_prompt_json)
+    except json.JSONDecodeError:
+        raise ValueError("Invalid JSON format for single_shot_prompt_json")
+
 
 class PromptRenderer:
-    def __init__(self, template_str: str):
+    """
+    Renders prompts from Jinja2 templates. Templates are compiled once and kept
+    in the environment's cache (optionally also as bytecode on disk), and the
+    static partials that do not depend on the request are rendered once and
+    reused, so a render only evaluates the per-request parts of the prompt.
+    """
+    # Variable name -> template file rendered once without request context
+    STATIC_PARTIALS = {"instructions": "prompt_instructions.jinja2"}
+
+    def __init__(self, template_str: str = None, template_dir: str = TEMPLATE_DIR, bytecode_cache_dir: str = None,
+                 auto_reload: bool = True, allowed_templates=ALLOWED_TEMPLATES):
         """
-        Initializes the PromptRenderer with a Jinja2 template string.
-        :param template_str: The Jinja2 template for rendering the prompt.
+        Initializes the PromptRenderer with a Jinja2 template.
+        :param template_str: Template file name inside template_dir, or inline Jinja2 source; defaults to prompt.jinja2.
+        :param template_dir: Directory templates and static partials are loaded from.
+        :param bytecode_cache_dir: Directory for compiled template bytecode; defaults to PROMPT_BYTECODE_CACHE_DIR.
+        :param auto_reload: Recompile templates whose file changed on disk (hot reload during development).
+        :param allowed_templates: Template names get_template and render accept; defaults to PROMPT_TEMPLATES.
         """
-        self.template = Template(template_str)
+        bytecode_cache_dir = bytecode_cache_dir or os.getenv("PROMPT_BYTECODE_CACHE_DIR")
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            auto_reload=auto_reload,
+            bytecode_cache=FileSystemBytecodeCache(bytecode_cache_dir) if bytecode_cache_dir else None,
+        )
+        self.template_dir = template_dir
+        self.allowed_templates = frozenset(allowed_templates)
+        self._static = {}  # variable name -> (template object, rendered text)
+        self._variables = {}  # template object -> names of the variables it reads
+        template_str = template_str or DEFAULT_TEMPLATE
+        if os.path.isfile(os.path.join(template_dir, template_str)):
+            self.template_name = template_str
+            self.template = self.env.get_template(template_str)
+        else:
+            self.template_name = None
+            self.template = self.env.from_string(template_str)
+            self._variables[self.template] = meta.find_undeclared_variables(self.env.parse(template_str))
 
-    def render(self, user_query: str, single_shot_prompt_pdf_text: str, single_shot_prompt_json: str, 
-               input_pdf_text: str, rag_results: list) -> str:
+    def get_template(self, template_name: str = None):
+        """
+        Returns the compiled template, picking up edits on disk when auto_reload is on.
+        :param template_name: One of allowed_templates; any other name raises TemplateNotFound.
+        """
+        if template_name:
+            if template_name not in self.allowed_templates:
+                raise TemplateNotFound(template_name)
+            return self.env.get_template(template_name)
+        if self.template_name:
+            self.template = self.env.get_template(self.template_name)
+        return self.template
+
+    def variables(self, template_name: str = None) -> set:
+        """Names of the variables the template reads, so callers can skip inputs it never renders."""
+        template = self.get_template(template_name)
+        if template not in self._variables:
+            source = self.env.loader.get_source(self.env, template.name)[0]
+            self._variables[template] = meta.find_undeclared_variables(self.env.parse(source))
+        return self._variables[template]
+
+    def static_context(self) -> dict:
+        """Renders each static partial once; re-renders only after its template was reloaded."""
+        context = {}
+        for name, template_name in self.STATIC_PARTIALS.items():
+            try:
+                template = self.env.get_template(template_name)
+            except TemplateNotFound:
+                context[name] = ""
+                continue
+            cached = self._static.get(name)
+            if cached is None or cached[0] is not template:
+                cached = (template, template.render())
+                self._static[name] = cached
+            context[name] = cached[1]
+        return context
+
+    def render(self, user_query: str, single_shot_prompt_pdf_text: str, single_shot_prompt_json: str,
+               input_pdf_text: str, rag_results: list, template_name: str = None) -> str:
         """
         Renders the prompt using the provided inputs.
         :param user_query: The query string provided by the user.
@@ -24,21 +111,21 @@ class PromptRenderer:
         :param single_shot_prompt_json: JSON formatted single-shot prompt.
         :param input_pdf_text: Extracted text from an input PDF.
         :param rag_results: A list of results retrieved using RAG (retrieval-augmented generation).
+        :param template_name: Optional template file to render instead of the default one, one of allowed_templates.
         :return: The rendered prompt string.
         """
-        try:
-            single_shot_prompt_dict = json.loads(single_shot_prompt_json)
-        except json.JSONDecodeError:
-            raise ValueError("Invalid JSON format for single_shot_prompt_json")
-        
-        logger.info("template >>>>> %s", self.template)
-        return self.template.render(
-            user_query=user_query,
-            single_shot_prompt_pdf_text=single_shot_prompt_pdf_text,
-            single_shot_prompt_json=single_shot_prompt_dict,
-            input_pdf_text=input_pdf_text,
-            rag_results=rag_results
-        )
+        single_shot_prompt_dict = parse_single_shot_json(single_shot_prompt_json)
+        template = self.get_template(template_name)
+        logger.debug("template >>>>> %s", template)
+        with timed("prompt_render"):
+            return template.render(
+                user_query=user_query,
+                single_shot_prompt_pdf_text=single_shot_prompt_pdf_text,
+                single_shot_prompt_json=single_shot_prompt_dict,
+                input_pdf_text=input_pdf_text,
+                rag_results=rag_results,
+                **self.static_context()
+            )
 
 # Example template
 jinja_template = """
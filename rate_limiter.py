@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket: on average `rate` calls per `period` seconds, with bursts of up
+    to `burst` calls. acquire() blocks until the call may proceed.
+    The bucket is per process; with several server workers, split the account's limit between them.
+    """
+    def __init__(self, rate, period=60.0, burst=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        :param rate: Calls allowed per period.
+        :param period: Length of the period in seconds.
+        :param burst: Calls allowed back to back after an idle spell; defaults to one.
+        :param clock: Monotonic time source, injectable for tests.
+        :param sleep: Sleep function, injectable for tests.
+        """
+        if rate <= 0 or period <= 0:
+            raise ValueError("rate and period must be positive")
+        self.rate = rate / period  # tokens per second
+        self.burst = burst if burst else 1
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.total_wait = 0.0
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds the limiter of LLM calls from LLM_RATE_LIMIT_RPM (requests per minute) and LLM_RATE_LIMIT_BURST.
+        :return: A RateLimiter, or None when no limit is configured.
+        """
+        rpm = float(os.getenv("LLM_RATE_LIMIT_RPM", 0))
+        if rpm <= 0:
+            return None
+        return cls(rpm, 60.0, burst=int(os.getenv("LLM_RATE_LIMIT_BURST", 1)))
+
+    def acquire(self):
+        """
+        Takes one token, waiting for the bucket to refill if it is empty.
+        :return: Seconds spent waiting.
+        """
+        started = self.clock()
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    waited = now - started
+                    self.acquired += 1
+                    self.total_wait += waited
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
+
+    def stats(self):
+        with self._lock:
+            return {"rate_per_second": self.rate, "burst": self.burst, "acquired": self.acquired,
+                    "avg_wait_seconds": self.total_wait / self.acquired if self.acquired else 0.0}
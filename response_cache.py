@@ -0,0 +1,139 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import numpy as np
+from cache import LRUCache, SqliteCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Caches LLM responses in two tiers:
+    - exact: keyed by a hash of the rendered prompt and the model parameters;
+    - semantic (optional): within the same context (PDF text, samples, model parameters),
+      a query whose embedding is close enough to an earlier query reuses that query's response.
+    Responses live in a pluggable backend (LRUCache in memory, or SqliteCache on disk);
+    the query embeddings of the semantic tier are kept in memory only.
+    """
+    def __init__(self, backend=None, encoder=None, similarity_threshold=None, max_queries_per_context=64):
+        """
+        :param backend: Object with the LRUCache get/set/clear/stats interface; defaults to an in-memory LRUCache.
+        :param encoder: Callable turning a query into an embedding, e.g. VectorInterviewDb.encode_query.
+        :param similarity_threshold: Cosine similarity at or above which a query counts as a near duplicate;
+                                     None disables the semantic tier.
+        :param max_queries_per_context: Query embeddings remembered per context for the semantic tier.
+        """
+        self.backend = backend if backend is not None else LRUCache(maxsize=1024, ttl=3600)
+        self.encoder = encoder if similarity_threshold is not None else None
+        self.similarity_threshold = similarity_threshold
+        self.max_queries_per_context = max_queries_per_context
+        # context key -> (normalized query embeddings, request keys); expires with the responses
+        self._contexts = LRUCache(maxsize=1024, ttl=self.backend.ttl)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, encoder=None):
+        """
+        Builds the cache from RESPONSE_CACHE (memory, sqlite or off), RESPONSE_CACHE_SIZE,
+        RESPONSE_CACHE_TTL, RESPONSE_CACHE_PATH and RESPONSE_CACHE_SIMILARITY.
+        :return: A ResponseCache, or None when caching is off.
+        """
+        kind = os.getenv("RESPONSE_CACHE", "memory").lower()
+        if kind == "off":
+            return None
+        ttl = float(os.getenv("RESPONSE_CACHE_TTL", 3600))
+        size = int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+        if kind == "sqlite":
+            backend = SqliteCache(os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite"), maxsize=size, ttl=ttl)
+        elif kind == "memory":
+            backend = LRUCache(maxsize=size, ttl=ttl)
+        else:
+            raise ValueError(f"Unknown RESPONSE_CACHE backend: {kind}")
+        similarity = os.getenv("RESPONSE_CACHE_SIMILARITY")
+        return cls(backend, encoder=encoder, similarity_threshold=float(similarity) if similarity else None)
+
+    @staticmethod
+    def key(*parts):
+        """Hashes the given values into a cache key."""
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def lookup(self, request_key, context_key, query):
+        """
+        :return: (response, tier) where tier is "exact" or "semantic", or (None, None) on a miss.
+        """
+        response = self.backend.get(request_key)
+        if response is not None:
+            self._count("exact_hits")
+            return response, "exact"
+
+        match = self._nearest(context_key, query)
+        if match is not None:
+            response = self.backend.get(match)
+            if response is not None:
+                self._count("semantic_hits")
+                return response, "semantic"
+
+        self._count("misses")
+        return None, None
+
+    def store(self, request_key, context_key, query, response):
+        self.backend.set(request_key, response)
+        if self.encoder is None:
+            return
+        embedding = self._embed(query)
+        with self._lock:
+            embeddings, keys = self._contexts.get(context_key) or (np.zeros((0, len(embedding)), dtype=np.float32), [])
+            if request_key in keys:
+                return
+            embeddings = np.vstack([embeddings, embedding])[-self.max_queries_per_context:]
+            keys = (keys + [request_key])[-self.max_queries_per_context:]
+            self._contexts.set(context_key, (embeddings, keys))
+
+    def clear(self):
+        self.backend.clear()
+        self._contexts.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "backend": self.backend.stats(),
+                "semantic": self.encoder is not None,
+                "similarity_threshold": self.similarity_threshold,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            }
+
+    def _nearest(self, context_key, query):
+        """Returns the request key of the most similar earlier query in the context, if it passes the threshold."""
+        if self.encoder is None:
+            return None
+        entry = self._contexts.get(context_key)
+        if entry is None:
+            return None
+        embeddings, keys = entry
+        similarities = embeddings @ self._embed(query)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        logger.info("Semantic response cache match (similarity %.3f)", similarities[best])
+        return keys[best]
+
+    def _embed(self, query):
+        embedding = np.asarray(self.encoder(query), dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
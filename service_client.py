@@ -0,0 +1,108 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from metrics import REQUEST_ID_HEADER, current_request_id
+
+
+class ServiceError(Exception):
+    """Raised when a downstream service answers with a non-2xx status."""
+    def __init__(self, url, status_code, body):
+        super().__init__(f"Request to {url} failed with status {status_code}: {body}")
+        self.url = url
+        self.status_code = status_code
+        self.body = body
+
+
+class ServiceClient:
+    """
+    Shared HTTP client for calls between the interview-eval services.
+    Keeps connections alive in a pooled session, applies per-call timeouts,
+    retries transient failures with exponential backoff, and runs independent
+    calls concurrently on a small thread pool.
+    Safe to create before a server forks its workers: each process opens its
+    own connections and threads on first use. The id of the request being served
+    is forwarded as X-Request-ID, so traces can be joined across services.
+    """
+    def __init__(self, timeout=None, retries=None, backoff_factor=0.3, pool_size=16, max_workers=8):
+        """
+        :param timeout: Default (connect, read) timeout in seconds; SERVICE_TIMEOUT sets the read timeout.
+        :param retries: Retries for connection errors and 502/504 responses; defaults to SERVICE_RETRIES or 2.
+        :param backoff_factor: Base delay in seconds for exponential backoff between retries.
+        :param pool_size: Keep-alive connections kept per downstream host.
+        :param max_workers: Threads available for concurrent calls through submit().
+        """
+        self.timeout = timeout if timeout else (3.05, float(os.getenv("SERVICE_TIMEOUT", 60)))
+        retry = Retry(
+            total=retries if retries is not None else int(os.getenv("SERVICE_RETRIES", 2)),
+            backoff_factor=backoff_factor,
+            # Not 503: our services send it while warming up or when no index has been built,
+            # which a retry a second later will not fix
+            status_forcelist=(502, 504),
+            allowed_methods=frozenset({"GET", "POST"}),  # every call we make is safe to repeat
+            raise_on_status=False,
+        )
+        self._retry = retry
+        self._pool_size = pool_size
+        self._max_workers = max_workers
+        self._pid = None
+        self._session = None
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _ensure_process(self):
+        """(Re)creates the session and thread pool in the current process; neither survives a fork."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+
+    def _open(self):
+        adapter = HTTPAdapter(pool_connections=self._pool_size, pool_maxsize=self._pool_size, max_retries=self._retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        self._session = session
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="service-client")
+        self._pid = os.getpid()
+
+    @property
+    def session(self):
+        self._ensure_process()
+        return self._session
+
+    @property
+    def executor(self):
+        self._ensure_process()
+        return self._executor
+
+    def request(self, method, url, timeout=None, headers=None, **kwargs):
+        request_id = current_request_id()
+        if request_id:
+            headers = dict(headers or {}, **{REQUEST_ID_HEADER: request_id})
+        response = self.session.request(method, url, timeout=timeout if timeout else self.timeout, headers=headers,
+                                        **kwargs)
+        if not response.ok:
+            raise ServiceError(url, response.status_code, response.text)
+        return response
+
+    def get_json(self, url, params=None, timeout=None):
+        return self.request("GET", url, params=params, timeout=timeout).json()
+
+    def post_json(self, url, json=None, files=None, timeout=None):
+        return self.request("POST", url, json=json, files=files, timeout=timeout).json()
+
+    def submit(self, fn, *args, **kwargs):
+        """Runs fn on the client's thread pool and returns a Future; fn sees the caller's request id."""
+        context = contextvars.copy_context()
+        return self.executor.submit(context.run, fn, *args, **kwargs)
+
+    def close(self):
+        if self._pid == os.getpid():
+            self._executor.shutdown(wait=False)
+            self._session.close()
+        self._pid = None
@@ -0,0 +1,104 @@
+import json
+import os
+import pandas as pd
+import pytest
+from feedback_fixtures import synthetic_feedback, synthetic_pdf
+import pdf_to_json
+from pdf_to_json import ParquetFeedbackWriter, ingest
+
+
+class Interrupted(Exception):
+    pass
+
+
+def write_pdfs(directory, count):
+    os.makedirs(directory)
+    for i in range(count):
+        with open(os.path.join(directory, f"feedback-{i}.pdf"), "wb") as f:
+            f.write(synthetic_pdf(synthetic_feedback(i, sentences_per_section=2)))
+
+
+def test_interrupted_parquet_ingestion_resumes(tmp_path):
+    pdf_dir = str(tmp_path / "pdfs")
+    output = str(tmp_path / "feedback.parquet")
+    manifest = output + ".manifest.jsonl"
+    write_pdfs(pdf_dir, 5)
+
+    def interrupt_after_three(line):
+        interrupt_after_three.ok += line.startswith("[ok]")
+        if interrupt_after_three.ok == 3:
+            raise Interrupted()
+    interrupt_after_three.ok = 0
+
+    with pytest.raises(Interrupted):
+        ingest([pdf_dir], output, manifest, workers=2, log=interrupt_after_three, batch_size=2)
+    with open(manifest, "r") as f:
+        done = {json.loads(line)["sha256"] for line in f}
+    assert 0 < len(done) < 5
+    assert done == set(pd.read_parquet(output)["sha256"])
+
+    # A part left behind by a hard crash is never renamed into place and must not be read
+    with open(os.path.join(output, ".part-crashed.parquet.tmp"), "wb") as f:
+        f.write(b"PAR1 truncated")
+
+    summary = ingest([pdf_dir], output, manifest, workers=2, log=lambda line: None, batch_size=2)
+    assert summary["skipped"] == len(done)
+    assert summary["ingested"] == 5 - len(done)
+
+    rows = pd.read_parquet(output)
+    assert len(rows) == 5
+    assert rows["sha256"].is_unique
+    assert all(len(sections) == 5 for sections in rows["sections"])
+
+
+def test_parquet_output_refuses_a_file(tmp_path):
+    pdf_dir = str(tmp_path / "pdfs")
+    write_pdfs(pdf_dir, 1)
+    output = tmp_path / "feedback.parquet"
+    output.write_bytes(b"")
+    with pytest.raises(FileExistsError):
+        ingest([pdf_dir], str(output), log=lambda line: None)
+
+
+def test_parquet_writers_never_replace_each_others_parts(tmp_path):
+    output = str(tmp_path / "feedback.parquet")
+    for i in range(2):  # well within the same second
+        writer = ParquetFeedbackWriter(output, batch_size=1)
+        writer.write({"path": f"{i}.pdf", "sha256": str(i), "sections": [], "seconds": 0.0})
+        writer.close()
+    assert sorted(pd.read_parquet(output)["sha256"]) == ["0", "1"]
+
+
+def test_ndjson_resume_after_crash_between_write_and_manifest(tmp_path):
+    pdf_dir = str(tmp_path / "pdfs")
+    output = str(tmp_path / "feedback.ndjson")
+    manifest = output + ".manifest.jsonl"
+    write_pdfs(pdf_dir, 3)
+    ingest([pdf_dir], output, manifest, workers=2, log=lambda line: None)
+
+    # The last record reached the output but not the manifest, and a further record was cut short
+    with open(manifest, "r") as f:
+        entries = f.readlines()
+    with open(manifest, "w") as f:
+        f.writelines(entries[:-1])
+    with open(output, "a") as f:
+        f.write('{"path": "half-written')
+
+    summary = ingest([pdf_dir], output, manifest, workers=2, log=lambda line: None)
+    assert summary["ingested"] == 0
+    with open(output, "r") as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 3
+    assert len({record["sha256"] for record in records}) == 3
+
+
+def test_parent_only_stats_files(tmp_path, monkeypatch):
+    pdf_dir = str(tmp_path / "pdfs")
+    output = str(tmp_path / "feedback.ndjson")
+    write_pdfs(pdf_dir, 2)
+
+    def fail(*args):
+        raise AssertionError("the parent process must not read the PDFs")
+    monkeypatch.setattr(pdf_to_json.PDFTextExtractor, "content_hash", staticmethod(fail))
+    summary = ingest([pdf_dir], output, output + ".manifest.jsonl", workers=2, log=lambda line: None)
+    assert summary["ingested"] == 2
@@ -0,0 +1,139 @@
+import logging
+import os
+from functools import lru_cache
+import tiktoken
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Context window per model family, longest prefix wins
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+
+@lru_cache(maxsize=8)
+def get_encoding(model: str):
+    """Returns the tiktoken encoding for a model, loaded once per process."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def context_window(model: str) -> int:
+    matches = [name for name in MODEL_CONTEXT_WINDOWS if model.startswith(name)]
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)] if matches else DEFAULT_CONTEXT_WINDOW
+
+
+class TokenBudget:
+    """
+    Fits the variable parts of a prompt (RAG chunks and long text sections) into
+    a token budget derived from the model's context window, so prompts never
+    overflow the window and their size stays under control.
+    """
+    # Chat format adds a few tokens per message on top of the content
+    TOKENS_PER_MESSAGE = 4
+    # Rendering one RAG chunk adds the list marker and newlines around it
+    TOKENS_PER_RAG_CHUNK = 4
+
+    def __init__(self, model: str, max_completion_tokens: int, max_prompt_tokens: int = None, min_rag_chunks: int = 2,
+                 safety_margin: int = 64, encoding=None):
+        """
+        :param model: Chat model the prompt is sent to; selects the tokenizer and the context window.
+        :param max_completion_tokens: Tokens reserved for the response.
+        :param max_prompt_tokens: Upper bound for the prompt; defaults to PROMPT_TOKEN_BUDGET, capped by the context window.
+        :param min_rag_chunks: RAG chunks kept before any text section is truncated.
+        :param safety_margin: Tokens left unused to absorb counting differences between the estimate and the API.
+        :param encoding: tiktoken encoding, injectable for tests.
+        """
+        self.model = model
+        self.encoding = encoding
+        available = context_window(model) - max_completion_tokens - safety_margin
+        if max_prompt_tokens is None and os.getenv("PROMPT_TOKEN_BUDGET"):
+            max_prompt_tokens = int(os.getenv("PROMPT_TOKEN_BUDGET"))
+        self.max_prompt_tokens = min(max_prompt_tokens, available) if max_prompt_tokens else available
+        self.min_rag_chunks = min_rag_chunks
+
+    def encode(self, text: str) -> list:
+        if self.encoding is None:
+            self.encoding = get_encoding(self.model)
+        # Interview feedback is untrusted text; count special-token lookalikes as plain text
+        return self.encoding.encode(text, disallowed_special=())
+
+    def count(self, text: str) -> int:
+        return len(self.encode(text)) if text else 0
+
+    def count_messages(self, messages: list) -> int:
+        """Estimates the prompt tokens of a chat request."""
+        return sum(self.TOKENS_PER_MESSAGE + self.count(message["content"]) for message in messages) + 3
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Keeps the first max_tokens tokens of text."""
+        if max_tokens <= 0:
+            return ""
+        tokens = self.encode(text)
+        return text if len(tokens) <= max_tokens else self.encoding.decode(tokens[:max_tokens])
+
+    def fit(self, fixed_tokens: int, rag_results: list, sections: dict):
+        """
+        Trims the prompt inputs until they fit the budget.
+        The lowest ranked RAG chunks are dropped first, down to min_rag_chunks, then the
+        sections are truncated in order, except the last one, which holds the primary
+        content: the remaining RAG chunks are dropped before it is truncated.
+        :param fixed_tokens: Tokens that cannot be trimmed (template text, system prompt, user query).
+        :param rag_results: Retrieved chunks, most relevant first.
+        :param sections: Ordered mapping of section name to text, least important first.
+        :return: (rag_results, sections, usage) with the trimmed inputs and a per-section token report.
+        """
+        rag_results = list(dict.fromkeys(rag_results))  # repeated chunks add tokens but no information
+        rag_costs = [self.count(chunk) + self.TOKENS_PER_RAG_CHUNK for chunk in rag_results]
+        section_costs = {name: self.count(text) for name, text in sections.items()}
+        sections = dict(sections)
+        usage = {
+            "budget": self.max_prompt_tokens,
+            "fixed": fixed_tokens,
+            "sections": dict(section_costs, rag_results=sum(rag_costs)),
+            "trimmed": {},
+            "rag_chunks_dropped": 0,
+        }
+        over = fixed_tokens + sum(rag_costs) + sum(section_costs.values()) - self.max_prompt_tokens
+
+        def drop_rag(keep):
+            nonlocal over
+            while over > 0 and len(rag_results) > keep:
+                rag_results.pop()
+                over -= rag_costs.pop()
+                usage["rag_chunks_dropped"] += 1
+
+        def trim_section(name):
+            nonlocal over
+            cut = min(over, section_costs[name])
+            if cut > 0:
+                sections[name] = self.truncate(sections[name], section_costs[name] - cut)
+                usage["trimmed"][name] = cut
+                over -= cut
+
+        names = list(sections)
+        drop_rag(self.min_rag_chunks)
+        for name in names[:-1]:
+            trim_section(name)
+        drop_rag(0)
+        if names:
+            trim_section(names[-1])
+
+        if over > 0:
+            raise ValueError(f"Prompt needs {fixed_tokens} tokens before any input, over the budget of "
+                             f"{self.max_prompt_tokens} tokens")
+        if usage["trimmed"] or usage["rag_chunks_dropped"]:
+            logger.warning("Prompt trimmed to fit %d tokens: %s, %d RAG chunks dropped", self.max_prompt_tokens,
+                           usage["trimmed"], usage["rag_chunks_dropped"])
+        usage["prompt_tokens_estimate"] = self.max_prompt_tokens + over
+        return rag_results, sections, usage
@@ -1,32 +1,372 @@
 import pandas as pd
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
+import hashlib
 import os
+import threading
+import time
+from artifacts import ArtifactBundle, unique_temp_path
+from cache import LRUCache
+from embedding_pipeline import EmbeddingPipeline
+from metrics import timed
+
+METADATA_COLUMNS = ["chunk", "level", "difficulty", "question_summary"]
+# Low-cardinality columns are held as categorical codes instead of one object per row
+CATEGORICAL_COLUMNS = {"level", "difficulty", "question_summary"}
+# Stable FAISS id and content key stored alongside the metadata in the artifact bundle
+BUNDLE_COLUMNS = ["id", "row_key"] + METADATA_COLUMNS
+# Columns searches can be restricted to, see VectorInterviewDb.search_many
+FILTER_COLUMNS = ("level", "difficulty")
+
+
+def canonical_model_name(name):
+    """
+    Model name as recorded in manifests and content keys: models of the sentence-transformers
+    organization are named without the prefix, as SentenceTransformer loads them either way.
+    """
+    prefix = "sentence-transformers/"
+    return name[len(prefix):] if name.startswith(prefix) else name
+
+
+def normalize_filters(filters):
+    """
+    Validates search filters.
+    :param filters: Mapping of a FILTER_COLUMNS name to a value or a list of accepted values, or None.
+    :return: Mapping of column name to a list of values, or None when nothing is filtered.
+    """
+    if not filters:
+        return None
+    normalized = {}
+    for column, values in filters.items():
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot filter on {column!r}, expected one of {FILTER_COLUMNS}")
+        values = [values] if isinstance(values, (str, int, float)) else list(values)
+        if values:
+            normalized[column] = [str(value) for value in values]
+    return normalized or None
+
+
+class CorpusSnapshot:
+    """
+    Immutable, in-memory view of a FAISS index and its chunk metadata.
+    Metadata is held column-wise as NumPy arrays, sorted by FAISS id, so a search
+    only materializes the top_k rows it returns. A new snapshot is built on every
+    (re)load and published with a single reference swap, so readers never see a
+    half-built corpus.
+    """
+    def __init__(self, index, ids, columns, version):
+        """
+        :param index: FAISS index returning the stable ids in `ids`.
+        :param ids: Sorted int64 array of the ids held by the index.
+        :param columns: Mapping of column name to a 1-D array (NumPy or Categorical) aligned with `ids`.
+        :param version: Monotonically increasing version number of this snapshot.
+        """
+        self.index = index
+        self.ids = ids
+        self.columns = columns
+        self.version = version
+        # Filter key -> (FAISS selector, bitmap it reads, number of ids it admits)
+        self._selectors = {}
+        self._selectors_lock = threading.Lock()
+
+    def __len__(self):
+        return self.index.ntotal
+
+    def rows(self, ids):
+        """Returns the metadata rows for the given FAISS ids as a DataFrame indexed by id."""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        # FAISS pads missing results with -1, which never matches a stored id
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == ids[found]
+        positions = positions[found]
+        return pd.DataFrame({name: column[positions] for name, column in self.columns.items()},
+                            index=pd.Index(ids[found], name="id"))
+
+    def filter_key(self, filters):
+        """
+        Resolves normalized filters to the matching category codes of each column; values match
+        case-insensitively. Filters selecting the same rows share a key, so the selector cache
+        stays bounded by the categories actually present.
+        """
+        if not filters:
+            return None
+        key = []
+        for column, values in sorted(filters.items()):
+            wanted = {value.strip().casefold() for value in values}
+            categories = self.columns[column].categories
+            key.append((column, tuple(code for code, category in enumerate(categories)
+                                      if str(category).strip().casefold() in wanted)))
+        return tuple(key)
+
+    def selector(self, filter_key):
+        """
+        Returns a FAISS selector admitting the ids that match a filter key, built once per snapshot and key.
+        :return: (selector, number of vectors it admits), or (None, len(self)) without a filter.
+        """
+        if filter_key is None:
+            return None, len(self)
+        entry = self._selectors.get(filter_key)
+        if entry is None:
+            mask = np.ones(len(self.ids), dtype=bool)
+            for column, codes in filter_key:
+                mask &= np.isin(self.columns[column].codes, codes)
+            members = np.zeros(int(self.ids[-1]) + 1 if len(self.ids) else 0, dtype=bool)
+            members[self.ids[mask]] = True
+            bitmap = np.packbits(members, bitorder="little")
+            # The selector reads the bitmap in place; the entry keeps it alive
+            entry = (faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)), bitmap, int(mask.sum()))
+            with self._selectors_lock:
+                entry = self._selectors.setdefault(filter_key, entry)
+        return entry[0], entry[2]
+
+    def first_per_question(self, ids):
+        """Keeps the best ranked of the ids that belong to the same question_summary, in rank order."""
+        codes = self.columns["question_summary"].codes[np.searchsorted(self.ids, ids)]
+        _, first = np.unique(codes, return_index=True)
+        return ids[np.sort(first)]
+
+
+class IndexConfig:
+    """
+    Describes which FAISS index structure to build and how to search it.
+    Supported index types: "flat" (exact, brute force), "ivf_flat", "ivf_pq" and "hnsw".
+    """
+    INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+    def __init__(self, index_type="flat", nlist=100, nprobe=8, pq_m=16, pq_nbits=8,
+                 hnsw_m=32, ef_construction=40, ef_search=64):
+        """
+        :param index_type: One of INDEX_TYPES.
+        :param nlist: Number of IVF cells (capped at the number of vectors when training).
+        :param nprobe: IVF cells visited per query.
+        :param pq_m: Number of PQ sub-quantizers; must divide the embedding dimension.
+        :param pq_nbits: Bits per PQ code; training needs at least 2**pq_nbits vectors.
+        :param hnsw_m: Neighbours per node in the HNSW graph.
+        :param ef_construction: HNSW candidate list size while building.
+        :param ef_search: HNSW candidate list size while searching.
+        """
+        if index_type not in self.INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}, expected one of {self.INDEX_TYPES}")
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.pq_nbits = pq_nbits
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(**config) if config else cls()
+
+    def __eq__(self, other):
+        return isinstance(other, IndexConfig) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"IndexConfig({self.to_dict()})"
+
+    @property
+    def supports_removal(self):
+        """HNSW graphs cannot drop vectors in place; they are rebuilt instead."""
+        return self.index_type != "hnsw"
+
+    def factory_string(self, dimension, num_vectors):
+        """FAISS index_factory description for this configuration."""
+        nlist = max(1, min(self.nlist, num_vectors))
+        if self.index_type == "flat":
+            return "IDMap,Flat"
+        if self.index_type == "ivf_flat":
+            return f"IVF{nlist},Flat"
+        if self.index_type == "ivf_pq":
+            if dimension % self.pq_m:
+                raise ValueError(f"pq_m={self.pq_m} does not divide the embedding dimension {dimension}")
+            if num_vectors < 2 ** self.pq_nbits:
+                raise ValueError(f"ivf_pq with pq_nbits={self.pq_nbits} needs at least {2 ** self.pq_nbits} vectors to train, got {num_vectors}")
+            return f"IVF{nlist},PQ{self.pq_m}x{self.pq_nbits}"
+        return f"IDMap,HNSW{self.hnsw_m}"
+
+    def build(self, embeddings, ids):
+        """Creates, trains and fills an index keyed by the given ids."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        num_vectors, dimension = embeddings.shape
+        index = faiss.index_factory(dimension, self.factory_string(dimension, num_vectors), faiss.METRIC_L2)
+        hnsw = self._hnsw(index)
+        if hnsw is not None:
+            hnsw.efConstruction = self.ef_construction
+        if not index.is_trained:
+            index.train(embeddings)
+        index.add_with_ids(embeddings, np.asarray(ids, dtype=np.int64))
+        self.apply_search_params(index)
+        return index
+
+    def apply_search_params(self, index):
+        """Sets nprobe / efSearch on whichever structure the index actually is."""
+        try:
+            faiss.extract_index_ivf(index).nprobe = self.nprobe
+        except RuntimeError:
+            pass  # not an IVF index
+        hnsw = self._hnsw(index)
+        if hnsw is not None:
+            hnsw.efSearch = self.ef_search
+
+    @classmethod
+    def search_parameters(cls, index, selector):
+        """
+        SearchParameters restricting a search to a selector's ids, keeping the index's own nprobe / efSearch.
+        With HNSW, a very selective filter can return fewer than top_k results unless ef_search is raised.
+        """
+        try:
+            return faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(index).nprobe)
+        except RuntimeError:
+            pass  # not an IVF index
+        hnsw = cls._hnsw(index)
+        if hnsw is not None:
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch)
+        return faiss.SearchParameters(sel=selector)
+
+    @staticmethod
+    def _hnsw(index):
+        inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+        return inner.hnsw if isinstance(inner, faiss.IndexHNSW) else None
+
 
 class VectorInterviewDb:   
     FAISS_INDEX_FILE = "docs/faiss_index.bin"
-    FAISS_METADATA_FILE = "docs/chunked_faiss_metadata.xlsx"
-    CHUNKED_FILE = "docs/chunked_interview_questions.xlsx"
-    CHUNKED_WITH_EMBEDDINGS_FILE = "docs/chunked_with_embeddings.xlsx"
+    DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+    CHUNK_SIZE = 300  # Adjust as needed
+    CHUNK_OVERLAP = 50  # Ensure some overlap for continuity
     REQUIRED_FILEDS = {"Level", "Question", "Difficulty", "LeetCode ID", "Question Text"}
+    # Chunks fetched per requested result when collapsing chunks of the same question
+    COLLAPSE_OVERFETCH = 4
 
-    def __init__(self, input_excel, model= None, index_file_path=FAISS_INDEX_FILE):
+    def __init__(self, input_excel, model= None, index_file_path=FAISS_INDEX_FILE, model_name=None, artifact_dir=None,
+                 batch_size=64, embedding_workers=0, index_config=None, cache_size=1024, cache_ttl=3600,
+                 refresh_interval=None, chunk_cache=None):
         self.index_file_path = index_file_path
         self.input_excel=input_excel
-        # Load embedding model
-        self.model = model if model else SentenceTransformer("all-MiniLM-L6-v2")
-        # Initialize reindex_needed based on the model name
-        self.reindex_needed = self.model._model_card_text != "all-MiniLM-L6-v2"
-    
-    text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=300,  # Adjust as needed
-    chunk_overlap=50  # Ensure some overlap for continuity
-    )  
+        # ANN structure built by populate_index; exact flat search unless configured otherwise
+        self.index_config = index_config if index_config else IndexConfig()
+        # Embedding pipeline settings used by populate_index
+        self.batch_size = batch_size
+        self.embedding_workers = embedding_workers
+        # Question text -> chunks computed elsewhere with the same CHUNK_SIZE and CHUNK_OVERLAP, e.g. shared by
+        # the indexes of several models; texts missing from it are split here
+        self.chunk_cache = chunk_cache
+        # Embedding model, loaded on first use (see the model property and warm_up); the name of a model
+        # passed in is taken from the model, as it keys the manifest, the row keys and the embedding workers
+        if model_name:
+            self.model_name = canonical_model_name(model_name)
+        else:
+            self.model_name = self.model_name_of(model) if model is not None else self.DEFAULT_MODEL_NAME
+        self._model = model
+        self._model_lock = threading.Lock()
+        # The model's fast tokenizer is not safe for concurrent encode calls ("Already borrowed")
+        self._encode_lock = threading.Lock()
+        self.warm_up_error = None
+        # Embeddings, metadata and manifest live next to the index file
+        self.artifacts = ArtifactBundle(artifact_dir if artifact_dir else os.path.splitext(index_file_path)[0] + "_artifacts")
+        # Resident corpus, loaded on first search and swapped atomically on rebuild
+        self._corpus = None
+        self._corpus_version = 0
+        self._corpus_lock = threading.RLock()
+        # Seconds between checks for an index file published by another process; None disables the check
+        self.refresh_interval = refresh_interval
+        self._corpus_mtime = None
+        self._last_refresh_check = 0.0
+        # Normalized query -> embedding, and (query, top_k, corpus version) -> result ids
+        self.embedding_cache = LRUCache(cache_size, cache_ttl)
+        self.result_cache = LRUCache(cache_size, cache_ttl)
+
+    # Shared by all instances, created on first chunking so serving never imports langchain
+    _text_splitter = None
+
+    @property
+    def text_splitter(self):
+        if VectorInterviewDb._text_splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            VectorInterviewDb._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=self.CHUNK_SIZE,
+                chunk_overlap=self.CHUNK_OVERLAP
+            )
+        return VectorInterviewDb._text_splitter
+
+    @property
+    def model(self):
+        """The SentenceTransformer, imported and loaded on first access."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @classmethod
+    def model_name_of(cls, model):
+        """
+        Name a loaded SentenceTransformer was created from, read from its model card. Older
+        sentence-transformers releases and locally saved models have none; DEFAULT_MODEL_NAME is
+        assumed then, so pass model_name along with any other model.
+        """
+        card = getattr(model, "model_card_data", None)
+        name = getattr(card, "base_model", None)
+        if not name:
+            print(f"The model passed in does not name its base model; assuming {cls.DEFAULT_MODEL_NAME}. "
+                  f"Pass model_name if it is a different model.")
+            return cls.DEFAULT_MODEL_NAME
+        return canonical_model_name(name)
+
+    @property
+    def reindex_needed(self):
+        return self.reindexing_required()
+
+    def warm_up(self, encode=True, background=False, corpus=True):
+        """
+        Loads the model and the resident corpus ahead of the first request.
+        :param encode: Also run one encode so lazy model initialization is paid here; leave it off
+                       in a process that forks workers afterwards, as an initialized torch runtime
+                       does not survive a fork.
+        :param background: Run in a daemon thread and return it, so a server can bind immediately.
+        :param corpus: Also load the resident corpus; off for callers that only encode queries.
+        """
+        def run():
+            started = time.perf_counter()
+            try:
+                self.model
+                if corpus:
+                    self.get_corpus()
+                if encode:
+                    with self._encode_lock:
+                        self.model.encode(["warm up"], convert_to_numpy=True)
+                print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                self.warm_up_error = str(e)
+                print(f"Warm-up failed: {e}")
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="vectordb-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self):
+        """True once the model is loaded and the corpus is resident, or there is no servable index to load."""
+        if self._model is None:
+            return False
+        if self._corpus is not None:
+            return True
+        # Without a servable index the service is still ready to accept an /index request
+        manifest = self.artifacts.read_manifest()
+        return manifest is None or self.embedding_mismatch(manifest) is not None
 
     def validate_excel(self):
-        if(self.reindexing_required()):
+        # An up-to-date index was built from this file, no need to read it again
+        if not self.reindexing_required():
             return True
         try:
             df = pd.read_excel(self.input_excel)  # Read the Excel file
@@ -37,104 +377,469 @@ class VectorInterviewDb:
 
     # Apply chunking
     def chunk_text(self, text):
+        if self.chunk_cache is not None and text in self.chunk_cache:
+            return self.chunk_cache[text]
         chunks = self.text_splitter.split_text(text)
         return chunks if chunks else [text]  # Ensure at least one chunk
 
     def reindexing_required(self):
-        return True if(os.path.exists(self.FAISS_INDEX_FILE) or self.reindex_needed == True) else False
-    
-    def populate_index(self):
-        df = pd.read_excel(self.input_excel)
+        """True when the persisted index is missing or out of date, see index_status."""
+        return self.index_status() is not None
+
+    def index_status(self):
+        """
+        Checks the persisted index against the current settings and input_excel using its manifest.
+        The source file is only hashed when its size or mtime changed, so confirming an
+        up-to-date index costs a manifest read and a stat call. A file touched without a
+        content change gets its new size and mtime recorded, so it is hashed only once.
+        :return: Reason why the index must be rebuilt, or None when it is up to date.
+        """
+        manifest = self.artifacts.read_manifest()
+        if manifest is None:
+            return "no index has been built"
+        mismatch = self.index_mismatch(manifest)
+        if mismatch:
+            return mismatch
+        source = manifest.get("source")
+        if not source:
+            return "the index manifest does not describe its source file"
+        try:
+            stat = os.stat(self.input_excel)
+        except FileNotFoundError:
+            # Nothing to rebuild from; keep serving the existing index
+            return None
+        if stat.st_size == source["size"] and stat.st_mtime_ns == source["mtime_ns"]:
+            return None
+        if self.file_hash(self.input_excel) != source["sha256"]:
+            return f"{self.input_excel} changed since the index was built"
+        try:
+            self.artifacts.update_manifest(source=dict(source, size=stat.st_size, mtime_ns=stat.st_mtime_ns))
+        except OSError as e:
+            print(f"Could not record the source fingerprint in the manifest: {e}")
+        return None
+
+    def embedding_mismatch(self, manifest):
+        """Reason why the stored vectors cannot be searched with this instance's model, or None."""
+        if canonical_model_name(manifest.get("model_name") or "") != self.model_name:
+            return f"index was built with {manifest.get('model_name')}, configured model is {self.model_name}"
+        # Only checked once the model is loaded; loading it just for this check would defeat a fast startup
+        if self._model is not None and manifest.get("dimension") != self._model.get_sentence_embedding_dimension():
+            return f"index has dimension {manifest.get('dimension')}, the model produces " \
+                   f"{self._model.get_sentence_embedding_dimension()}"
+        return None
+
+    def index_mismatch(self, manifest):
+        """Reason why the stored index differs from this instance's model, chunking or index settings, or None."""
+        mismatch = self.embedding_mismatch(manifest)
+        if mismatch:
+            return mismatch
+        if manifest.get("chunk_size") != self.CHUNK_SIZE or manifest.get("chunk_overlap") != self.CHUNK_OVERLAP:
+            return "index was built with different chunking parameters"
+        if IndexConfig.from_dict(manifest.get("index_config")) != self.index_config:
+            return "index was built with a different index configuration"
+        return None
+
+    def source_fingerprint(self):
+        """Size, mtime and SHA-256 of input_excel, recorded in the manifest of every index built from it."""
+        stat = os.stat(self.input_excel)
+        return {"path": self.input_excel, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                "sha256": self.file_hash(self.input_excel)}
+
+    @staticmethod
+    def file_hash(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
 
-        chunked_data = []
-        for _, row in df.iterrows():
+    def row_keys(self, df):
+        """
+        Content key of every question row: a hash of its Question Text, the chunking
+        parameters and the model name. Identical questions get an occurrence suffix
+        so each row keeps its own key.
+        """
+        seen = {}
+        keys = []
+        for text in df["Question Text"]:
+            digest = hashlib.sha256(
+                f"{self.model_name}\0{self.CHUNK_SIZE}\0{self.CHUNK_OVERLAP}\0{text}".encode("utf-8")).hexdigest()
+            occurrence = seen.get(digest, 0)
+            seen[digest] = occurrence + 1
+            keys.append(f"{digest}:{occurrence}")
+        return keys
+
+    def iter_chunks(self, df, row_keys=None):
+        """Splits every question into chunks, yielding one metadata row per chunk."""
+        row_keys = row_keys if row_keys is not None else self.row_keys(df)
+        for row_key, (_, row) in zip(row_keys, df.iterrows()):
             level = row["Level"]
             question = row["Question"]
             difficulty = row["Difficulty"]
-            leetcode_id = row["LeetCode ID"]
             question_text = row["Question Text"]
             
             # Split question into chunks
             chunks = self.chunk_text(question_text)
             
             for chunk in chunks:
-                chunked_data.append({"chunk": chunk, "level": level, 
-                                    "difficulty": difficulty, "question_summary": question })
+                yield {"row_key": row_key, "chunk": chunk, "level": level, 
+                       "difficulty": difficulty, "question_summary": question }
 
-        # Convert to DataFrame
-        chunked_df = pd.DataFrame(chunked_data)
+    def write_index(self, index):
+        """Writes the FAISS index to a temporary file and renames it over index_file_path."""
+        tmp_path = unique_temp_path(self.index_file_path)
+        try:
+            faiss.write_index(index, tmp_path)
+            os.replace(tmp_path, self.index_file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
-        # Save the chunked data to a new Excel file
-        chunked_df.to_excel(self.CHUNKED_FILE, index=False)
-        print(f"Chunking complete! Data saved to {self.CHUNKED_FILE}")
+    def embedding_pipeline(self, batch_size=None, workers=None, dimension=None):
+        # The model is loaded on demand: a pooled build encodes in the workers and never needs it here
+        return EmbeddingPipeline(lambda: self.model, self.model_name,
+                                 batch_size=batch_size if batch_size else self.batch_size,
+                                 workers=self.embedding_workers if workers is None else workers,
+                                 lock=self._encode_lock, dimension=dimension)
 
-        # Convert each chunk to an embedding
-        chunked_df["embedding"] = chunked_df["chunk"].apply(lambda x: self.model.encode(x).tolist())
+    def embed_questions(self, df, row_keys=None, batch_size=None, workers=None, dimension=None):
+        """
+        Streams the chunks of the given question rows into the batched encoder.
+        :param dimension: Embedding dimension, if known, so an empty selection needs no model.
+        :return: Tuple of (chunk DataFrame without ids, float32 embedding matrix).
+        """
+        # Collect chunk metadata on the way through so chunking overlaps with encoding
+        chunk_rows = []
+        def chunk_stream():
+            for row in self.iter_chunks(df, row_keys):
+                chunk_rows.append(row)
+                yield row["chunk"]
 
-        # Save with embeddings
-        chunked_df.to_excel(self.CHUNKED_WITH_EMBEDDINGS_FILE, index=False)
-        print(f"Embeddings saved to {self.CHUNKED_WITH_EMBEDDINGS_FILE}")
+        with timed("index_embed"):
+            embeddings = self.embedding_pipeline(batch_size, workers, dimension).encode(chunk_stream())
+        return pd.DataFrame(chunk_rows, columns=BUNDLE_COLUMNS[1:]), embeddings
 
-        # Load the Excel file again
-        df = pd.read_excel(self.CHUNKED_WITH_EMBEDDINGS_FILE)
+    def populate_index(self, batch_size=None, workers=None, incremental=False):
+        """
+        Chunks and embeds the whole question bank and publishes a new index.
+        :param batch_size: Chunks per encode call; defaults to the instance setting.
+        :param workers: Worker processes for encoding; defaults to the instance setting.
+        :param incremental: Only re-embed changed questions, see update_index.
+        :return: Dict summarizing what was indexed.
+        """
+        if incremental:
+            return self.update_index(batch_size, workers)
 
-        # Ensure embeddings are stored as lists
-        df["embedding"] = df["embedding"].apply(lambda x: np.array(eval(x), dtype=np.float32))
+        # One build at a time per bundle, across threads and server workers
+        with self.artifacts.build_lock():
+            # Fingerprint before reading, so a sheet edited during the build is detected as changed afterwards
+            source = self.source_fingerprint()
+            df = pd.read_excel(self.input_excel)
+            chunked_df, embeddings = self.embed_questions(df, batch_size=batch_size, workers=workers)
+            chunked_df.insert(0, "id", np.arange(len(chunked_df), dtype=np.int64))
+            print(f"Chunking complete! {len(chunked_df)} chunks from {len(df)} questions")
 
-        # Convert embeddings into a NumPy array
-        embeddings = np.vstack(df["embedding"].values)
+            # Create a FAISS index
+            index = self.build_index(embeddings, chunked_df["id"].to_numpy())
+            self._save_index(index, chunked_df, embeddings, next_id=len(chunked_df), source=source)
+        return {"mode": "full", "questions": len(df), "chunks": len(chunked_df)}
 
-        print("Loaded", len(embeddings), "embeddings of dimension", embeddings.shape[1])
+    def update_index(self, batch_size=None, workers=None):
+        """
+        Incrementally refreshes the index from input_excel: questions whose content key
+        is new are chunked and embedded, questions that disappeared are removed, and
+        unchanged questions keep their embeddings and FAISS ids (their level, difficulty
+        and summary are refreshed from the sheet). When nothing changed, only the source
+        fingerprint in the manifest is updated. Falls back to populate_index when no
+        compatible index exists.
+        :return: Dict summarizing the update.
+        """
+        # One build at a time per bundle, across threads and server workers
+        with self.artifacts.build_lock():
+            return self._update_index(batch_size, workers)
 
-        # Get embedding dimensions
-        dimension = embeddings.shape[1]  # Should match the embedding size (e.g., 384 for MiniLM)
+    def _update_index(self, batch_size, workers):
+        manifest = self.artifacts.read_manifest()
+        mismatch = ("no index has been built" if manifest is None or not os.path.exists(self.index_file_path)
+                    else self.index_mismatch(manifest))
+        if mismatch:
+            print(f"No compatible index to update ({mismatch}); running a full rebuild.")
+            return self.populate_index(batch_size, workers)
 
-        # Create a FAISS index
-        index = faiss.IndexFlatL2(dimension)  # L2 (Euclidean) distance index
+        source = self.source_fingerprint()
+        df = pd.read_excel(self.input_excel)
+        keys = pd.Series(self.row_keys(df))
+        old = self.artifacts.load_metadata(columns=BUNDLE_COLUMNS)
+        old_embeddings = self.artifacts.load_embeddings()
 
-        # Add embeddings to the index
-        index.add(embeddings)
+        keep = old["row_key"].isin(keys).to_numpy()
+        removed_ids = old["id"].to_numpy()[~keep]
+        changed = ~keys.isin(old["row_key"]).to_numpy()
 
-        # Save the FAISS index
-        faiss.write_index(index, self.FAISS_INDEX_FILE)
-        print(f"FAISS index saved to {self.FAISS_INDEX_FILE}")
+        # Unchanged chunks keep their ids and vectors; descriptive columns come from the current sheet
+        current = pd.DataFrame({"row_key": keys, "level": df["Level"].to_numpy(),
+                                "difficulty": df["Difficulty"].to_numpy(), "question_summary": df["Question"].to_numpy()})
+        kept = old[keep][["id", "row_key", "chunk"]].merge(current, on="row_key", how="left")
 
-        self.index = index
-        # Save metadata (chunked text + level) to keep reference to FAISS results
-        df[["chunk", "level", "difficulty", "question_summary"]].to_excel(self.FAISS_METADATA_FILE, index=False)
-        print(f"FAISS metadata saved to {self.FAISS_METADATA_FILE}")
-
-    def search_faiss(self, query, top_k=5):
-        df = self.load_chunked_data()
-        query_embedding = self.encode_query(query)
-        # Load FAISS index if not in memory
-        if not hasattr(self, "index"):
-            if self.reindexing_required():
-                self.index = faiss.read_index(self.FAISS_INDEX_FILE)
+        stats = {"mode": "incremental", "questions": len(df), "chunks": int(keep.sum()),
+                 "added": int(changed.sum()), "removed": int(old.loc[~keep, "row_key"].nunique()),
+                 "unchanged": int((~changed).sum())}
+        if not changed.any() and not len(removed_ids) and \
+                kept[BUNDLE_COLUMNS].reset_index(drop=True).equals(old[BUNDLE_COLUMNS].reset_index(drop=True)):
+            # Nothing to publish: leave the index file alone, so other workers do not reload it, and
+            # only record the sheet's new fingerprint so it is not compared again
+            self.artifacts.update_manifest(source=source)
+            print(f"Index is up to date: {stats}")
+            return stats
+
+        added, added_embeddings = self.embed_questions(df[changed], keys[changed].tolist(), batch_size, workers,
+                                                       dimension=manifest["dimension"])
+        next_id = manifest["next_id"]
+        added.insert(0, "id", np.arange(next_id, next_id + len(added), dtype=np.int64))
+
+        # New ids are always larger than existing ones, so the bundle stays sorted by id
+        chunked_df = pd.concat([kept[BUNDLE_COLUMNS], added[BUNDLE_COLUMNS]], ignore_index=True)
+        embeddings = np.vstack([old_embeddings[keep], added_embeddings])
+
+        if len(removed_ids) and not self.index_config.supports_removal:
+            # Rebuild the graph from stored vectors; still no re-embedding of unchanged rows
+            index = self.build_index(embeddings, chunked_df["id"].to_numpy())
+        else:
+            index = faiss.read_index(self.index_file_path)
+            if len(removed_ids):
+                index.remove_ids(removed_ids.astype(np.int64))
+            if len(added):
+                index.add_with_ids(added_embeddings, added["id"].to_numpy())
+        self._save_index(index, chunked_df, embeddings, next_id=next_id + len(added), source=source)
+
+        stats["chunks"] = len(chunked_df)
+        print(f"Incremental update complete: {stats}")
+        return stats
+
+    def _save_index(self, index, chunked_df, embeddings, next_id, source=None):
+        """Persists the bundle and index, then swaps them in for concurrent searches."""
+        # Bundle and index are replaced together, so a worker loading meanwhile never pairs the new
+        # metadata with the old index
+        with self.artifacts.publish_lock():
+            # Save embeddings, metadata and manifest as a binary bundle
+            manifest = self.artifacts.write(embeddings, chunked_df, self.model_name,
+                                            chunk_size=self.CHUNK_SIZE, chunk_overlap=self.CHUNK_OVERLAP,
+                                            next_id=int(next_id), index_config=self.index_config.to_dict(),
+                                            source=source)
+            print("Saved", manifest["rows"], "embeddings of dimension", manifest["dimension"], "to", self.artifacts.directory)
+
+            # Save the FAISS index
+            self.write_index(index)
+            print(f"FAISS index saved to {self.index_file_path}")
+
+        # Swap the freshly built corpus in for concurrent searches
+        self._publish_corpus(index, chunked_df, self._index_mtime())
+
+    def build_index(self, embeddings, ids):
+        """Builds an in-memory FAISS index of the configured type over an embedding matrix, keyed by stable ids."""
+        with timed("index_build"):
+            index = self.index_config.build(embeddings, ids)
+        print(f"Built {self.index_config.index_type} index over {index.ntotal} vectors")
+        return index
+
+    @property
+    def index(self):
+        corpus = self._corpus
+        return corpus.index if corpus is not None else None
+
+    @property
+    def corpus_version(self):
+        """Version of the resident corpus; bumped every time a new index is published."""
+        return self._corpus_version
+
+    def _publish_corpus(self, index, metadata, index_mtime=None):
+        """
+        Builds a new CorpusSnapshot from an index and its metadata and swaps it in.
+        :param index_mtime: Modification time of the index file the corpus corresponds to, see refresh_if_stale.
+        """
+        columns = {
+            name: metadata[name].astype("category").array if name in CATEGORICAL_COLUMNS
+            else metadata[name].to_numpy()
+            for name in METADATA_COLUMNS
+        }
+        if len(metadata) != index.ntotal:
+            raise ValueError(f"Metadata has {len(metadata)} rows but the index holds {index.ntotal} vectors")
+        ids = metadata["id"].to_numpy(dtype=np.int64)
+        with self._corpus_lock:
+            self._corpus_version += 1
+            self._corpus = CorpusSnapshot(index, ids, columns, self._corpus_version)
+            self._corpus_mtime = index_mtime
+            # Cached results are keyed by version, so old entries can never be served; drop them to free memory
+            self.result_cache.clear()
+        return self._corpus
+
+    def load_corpus(self):
+        """
+        Loads the persisted FAISS index and its metadata into memory, replacing the resident corpus.
+        :return: The new CorpusSnapshot, or None if no index has been built yet.
+        """
+        # Shared with other loaders; waits only for a publish in progress (see _save_index)
+        with self.artifacts.publish_lock(shared=True):
+            manifest = self.artifacts.read_manifest()
+            if manifest is None:
+                return None
+            mismatch = self.embedding_mismatch(manifest)
+            if mismatch:
+                # Query embeddings would not be comparable with the stored vectors
+                print(f"Not loading the index at {self.index_file_path}: {mismatch}. Rebuild it with populate_index().")
+                return None
+            index_mtime = self._index_mtime()
+            metadata = self.load_chunked_data()
+            if os.path.exists(self.index_file_path):
+                index = faiss.read_index(self.index_file_path)
+                self.index_config.apply_search_params(index)
             else:
-                print("FAISS index does not exist. Please run `populate_index()` first.")
-                return None        
-        distances, indices = self.index.search(query_embedding, top_k)
+                # The bundle already holds the vectors; rebuilding the index needs no model inference
+                index = self.build_index(self.artifacts.load_embeddings(), metadata["id"].to_numpy())
+                self.write_index(index)
+                index_mtime = self._index_mtime()
+        return self._publish_corpus(index, metadata, index_mtime)
+
+    def get_corpus(self):
+        """Returns the resident corpus, loading it from disk on first use."""
+        corpus = self._corpus
+        if corpus is None:
+            with self._corpus_lock:
+                corpus = self._corpus if self._corpus is not None else self.load_corpus()
+        elif self.refresh_interval is not None:
+            corpus = self.refresh_if_stale()
+        return corpus
+
+    def refresh_if_stale(self):
+        """
+        Reloads the corpus when the index file on disk is newer than the resident one, e.g. after
+        another server worker rebuilt it. Checks at most once every refresh_interval seconds.
+        :return: The resident corpus.
+        """
+        now = time.monotonic()
+        if now - self._last_refresh_check < (self.refresh_interval or 0):
+            return self._corpus
+        self._last_refresh_check = now
+        index_mtime = self._index_mtime()
+        if index_mtime is not None and index_mtime != self._corpus_mtime:
+            with self._corpus_lock:
+                if index_mtime != self._corpus_mtime:
+                    print(f"Index file {self.index_file_path} changed on disk, reloading")
+                    self.load_corpus()
+        return self._corpus
 
-            # Retrieve matching chunks
-        results = df.iloc[indices[0]]
+    def _index_mtime(self):
+        try:
+            return os.stat(self.index_file_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def search_faiss(self, query, top_k=5, filters=None, collapse=False):
+        results = self.search_many([query], top_k=top_k, filters=filters, collapse=collapse)
+        return results[0] if results is not None else None
+
+    def search_many(self, queries, top_k=5, filters=None, collapse=False):
+        """
+        Searches several queries with one batched encode and a single FAISS search.
+        Filters are applied inside the search through a precomputed ID selector, so a
+        filtered top_k costs about the same as an unfiltered one.
+        :param queries: List of query strings.
+        :param top_k: Number of chunks to return per query.
+        :param filters: Optional mapping of "level" and/or "difficulty" to the accepted value(s), see normalize_filters.
+        :param collapse: Return only the best ranked chunk of each question_summary, fetching more chunks as needed.
+        :return: List with one DataFrame of matching chunks per query, or None if no index exists.
+        """
+        filters = normalize_filters(filters)
+        corpus = self.get_corpus()
+        if corpus is None:
+            print("FAISS index does not exist. Please run `populate_index()` first.")
+            return None
+        if not queries:
+            return []
+
+        filter_key = corpus.filter_key(filters)
+        keys = [(self.normalize_query(query), top_k, filter_key, collapse, corpus.version) for query in queries]
+        result_ids = [self.result_cache.get(key) for key in keys]
+        misses = [i for i, ids in enumerate(result_ids) if ids is None]
+        if misses:
+            query_embeddings = self.encode_queries([queries[i] for i in misses])
+            for i, ids in zip(misses, self._search_ids(corpus, query_embeddings, top_k, filter_key, collapse)):
+                result_ids[i] = ids
+                self.result_cache.set(keys[i], ids)
+
+        # Retrieve matching chunks
+        return [corpus.rows(ids) for ids in result_ids]
+
+    def _search_ids(self, corpus, query_embeddings, top_k, filter_key, collapse):
+        """
+        Runs the FAISS search for a batch of query embeddings.
+        When collapsing, COLLAPSE_OVERFETCH chunks are fetched per result, and queries that still
+        have fewer than top_k distinct questions are searched again with twice as many.
+        :return: One array of result ids per query, best first.
+        """
+        selector, available = corpus.selector(filter_key)
+        if available == 0:
+            return [np.empty(0, dtype=np.int64)] * len(query_embeddings)
+        params = IndexConfig.search_parameters(corpus.index, selector) if selector is not None else None
+        fetch = min(top_k * self.COLLAPSE_OVERFETCH if collapse else top_k, available)
+        results = [None] * len(query_embeddings)
+        pending = np.arange(len(query_embeddings))
+        while len(pending):
+            with timed("faiss_search"):
+                _, indices = corpus.index.search(query_embeddings[pending], fetch, params=params)
+            retry = []
+            for i, ids in zip(pending, indices):
+                if collapse:
+                    ids = corpus.first_per_question(ids[ids >= 0])[:top_k]
+                    if len(ids) < top_k and fetch < available:
+                        retry.append(i)
+                results[i] = ids
+            pending = np.asarray(retry, dtype=np.int64)
+            fetch = min(fetch * 2, available)
         return results
     
     # Encode the query using the same embedding model
     def encode_query(self, query):
-        query_embedding = self.model.encode(query).astype(np.float32)
-        return np.array([query_embedding])
+        return self.encode_queries([query])
+
+    def encode_queries(self, queries):
+        """
+        Encodes a list of queries, running the model only for queries missing from the embedding cache.
+        :return: float32 matrix with one row per query.
+        """
+        keys = [self.normalize_query(query) for query in queries]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if misses:
+            with self._encode_lock, timed("encode"):
+                encoded = self.model.encode([queries[i] for i in misses], batch_size=self.batch_size,
+                                            convert_to_numpy=True)
+            encoded = np.asarray(encoded, dtype=np.float32)
+            for i, embedding in zip(misses, encoded):
+                embeddings[i] = embedding
+                self.embedding_cache.set(keys[i], embedding)
+        return np.vstack(embeddings)
+
+    @staticmethod
+    def normalize_query(query):
+        """Collapses whitespace so trivially different spellings of a query share cache entries."""
+        return " ".join(query.split())
+
+    def cache_stats(self):
+        return {"embeddings": self.embedding_cache.stats(), "results": self.result_cache.stats()}
 
-    # Load the chunked interview questions
+    # Load the chunk metadata; embeddings already live in the FAISS index
     def load_chunked_data(self):
-        df = pd.read_excel(self.CHUNKED_WITH_EMBEDDINGS_FILE)
-        df["embedding"] = df["embedding"].apply(lambda x: np.array(eval(x), dtype=np.float32))
+        df = self.artifacts.load_metadata(columns=["id"] + METADATA_COLUMNS)
         print(f"Loaded {len(df)} chunked interview questions.")
         return df
 
 if __name__ == "__main__":
     vdb = VectorInterviewDb("docs/interview_questions.xlsx")
-    vdb.populate_index()
+    reason = vdb.index_status()
+    if reason:
+        print(f"Rebuilding the index: {reason}")
+        vdb.populate_index(incremental=True)
     results = vdb.search_faiss("find list related questions")
     print(results[["chunk", "level"]])
 
@@ -1,25 +1,30 @@
-from flask import Flask, request, jsonify
-import requests
-from openai import OpenAI
-from vectordb import VectorInterviewDb
+from flask import Flask, Response, request, jsonify
 from copilot import InterviewCopilot
+from service_client import ServiceClient, ServiceError
+from response_cache import ResponseCache
+from metrics import current_request_id, install_metrics, request_id_var
 import os
 import logging
 import json
+import threading
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+install_metrics(app, "interview_copilot")
 
 # Initialize dependencies
 VECTOR_DB_FILE = "docs/interview_questions.xlsx"
-vector_db = VectorInterviewDb(VECTOR_DB_FILE)
+vector_db = None
+if os.getenv("RESPONSE_CACHE_SIMILARITY"):
+    # Only the near-duplicate tier of the response cache needs the embedding model
+    from vectordb import VectorInterviewDb
+    vector_db = VectorInterviewDb(VECTOR_DB_FILE)
 
-# Load Jinja2 template from file
-with open("prompt.jinja2", "r") as file:
-    jinja_template = file.read()
+# Jinja2 template, loaded and compiled by the PromptRenderer
+PROMPT_TEMPLATE = "prompt.jinja2"
 
 # Load sample data from files
 with open("docs/training data/sample_pdf.txt", "r") as file:
@@ -28,17 +33,64 @@ with open("docs/training data/sample_pdf.txt", "r") as file:
 with open("docs/training data/sample_questions_from_pdf.json", "r") as file:
     SAMPLE_JSON = json.dumps(json.load(file))  # Convert dict to JSON string
 
-# Initialize OpenAI client and copilot
-openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-copilot = InterviewCopilot(jinja_template, vector_db, openai_client)
+# Initialize the copilot; the OpenAI client is created on first use or during warm-up
+service_client = ServiceClient()
+# Near-duplicate queries are matched with the vector DB's embedding model
+response_cache = ResponseCache.from_env(encoder=vector_db.encode_query if vector_db else None)
+copilot = InterviewCopilot(PROMPT_TEMPLATE, vector_db, service_client=service_client, response_cache=response_cache)
 
-PDF_TO_JSON_URL = "http://localhost:5002/upload"
+# "preload" warms up during import (gunicorn master), "background" in a thread, "lazy" on the first request
+WARM_UP = os.getenv("SERVICE_WARM_UP", "background")
+warmed_up = threading.Event()
+warm_up_error = None
+
+def warm_up():
+    global warm_up_error
+    try:
+        copilot.warm_up()
+        if vector_db is not None:
+            vector_db.warm_up(encode=WARM_UP != "preload", corpus=False)
+        warmed_up.set()
+    except Exception as e:
+        warm_up_error = str(e)
+        logger.error("Warm-up failed: %s", e)
+
+if WARM_UP == "preload":
+    warm_up()
+elif WARM_UP == "background":
+    threading.Thread(target=warm_up, name="copilot-warm-up", daemon=True).start()
+else:
+    warmed_up.set()
+
+PDF_TO_JSON_URL = os.getenv('PDF_TO_JSON_URL', 'http://localhost:5002/upload')
+# "single" answers for the first interview section, "map_reduce" for all of them
+MODES = ("single", "map_reduce")
+
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Liveness endpoint: the process is up and serving requests.
+    """
+    return jsonify({"status": "ok"}), 200
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness endpoint: 200 once the OpenAI client, tokenizer and models are loaded, 503 while warming up.
+    """
+    if warmed_up.is_set():
+        return jsonify({"status": "ready"}), 200
+    return jsonify({"status": "warming up", "error": warm_up_error}), 503
 
 @app.route("/copilot", methods=["POST"])
 def process_copilot():
     """
     Endpoint to process user query, retrieve relevant data using RAG, 
     and generate a response using the copilot.
+    Pass `stream=true` (query string or form field) to receive Server-Sent Events instead:
+    pdf_extracted, rag_ready, prompt_rendered, token (one per LLM delta), done or error.
+    Pass `mode=map_reduce` to answer for every interview section of the PDF instead of the first one:
+    the sections are prompted concurrently and their JSON answers merged; it cannot be streamed.
     """
     try:
         if "file" not in request.files:
@@ -50,25 +102,87 @@ def process_copilot():
         if not user_query:
             return jsonify({"error": "Query parameter is required."}), 400
         
+        stream = request.args.get("stream", request.form.get("stream", "false")).lower() == "true"
+        mode = request.args.get("mode", request.form.get("mode", "single")).lower()
+        if mode not in MODES:
+            return jsonify({"error": f"mode should be one of {', '.join(MODES)}"}), 400
+        if mode == "map_reduce" and stream:
+            return jsonify({"error": "mode=map_reduce cannot be streamed"}), 400
+
+        # The search only needs the query, so run it while the PDF is being converted;
+        # map_reduce searches per section once the sections are known
+        search_future = copilot.start_search(user_query) if mode == "single" else None
+
+        if stream:
+            # Read the upload now; the event stream runs after this request handler returns
+            upload = (file.filename, file.read(), file.mimetype)
+            return Response(stream_copilot(user_query, upload, search_future, current_request_id()),
+                            mimetype="text/event-stream",
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
         # Convert PDF to JSON
-        pdf_response = requests.post(PDF_TO_JSON_URL, files={"file": file})
-        if pdf_response.status_code != 200:
-            return jsonify({"error": "Failed to process PDF"}), pdf_response.status_code
+        try:
+            pdf_contents = service_client.post_json(PDF_TO_JSON_URL, files={"file": (file.filename, file.stream, file.mimetype)})
+        except ServiceError as e:
+            logger.error("PDF conversion failed: %s", e)
+            return jsonify({"error": "Failed to process PDF"}), e.status_code
+
+        if mode == "map_reduce":
+            logger.info("User Query: %s, over %d sections", user_query, len(pdf_contents))
+            result = copilot.run_map_reduce(user_query, pdf_contents, sample_pdf_text=SAMPLE_PDF_TEXT,
+                                            sample_json=SAMPLE_JSON)
+            return jsonify(result), 200
         
         # Handle list response from PDF service
-        pdf_contents = pdf_response.json()
-        pdf_text = pdf_contents[0].get("content", "") if pdf_contents else ""
+        pdf_text = first_section_text(pdf_contents)
         
         # Process query using copilot
         logger.info("PDF Text extracted: %s", pdf_text[:200] + "..." if len(pdf_text) > 200 else pdf_text)
         logger.info("User Query: %s", user_query)
         
-        response = copilot.process_query(user_query, pdf_text, sample_pdf_text=SAMPLE_PDF_TEXT, sample_json=SAMPLE_JSON)
+        result = copilot.run(user_query, pdf_text, sample_pdf_text=SAMPLE_PDF_TEXT, sample_json=SAMPLE_JSON,
+                             rag_results=search_future)
         
-        return jsonify({"response": response}), 200
+        return jsonify({"response": result["response"], "usage": result["usage"]}), 200
     except Exception as e:
         logger.error("Error processing request: %s", str(e))
         return jsonify({"error": str(e)}), 500
 
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """
+    Endpoint reporting hit/miss counters of the LLM response cache.
+    """
+    if response_cache is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify(dict(response_cache.stats(), enabled=True)), 200
+
+def first_section_text(pdf_contents):
+    """Returns the content of the first interview section from the PDF service response."""
+    return (pdf_contents[0].get("content") or "") if pdf_contents else ""
+
+def sse_event(event, data):
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_copilot(user_query, upload, search_future, request_id):
+    """Yields Server-Sent Events for each copilot stage as soon as it completes."""
+    # The stream is consumed after the request has been torn down; keep forwarding its request id
+    token = request_id_var.set(request_id)
+    try:
+        pdf_contents = service_client.post_json(PDF_TO_JSON_URL, files={"file": upload})
+        pdf_text = first_section_text(pdf_contents)
+        yield sse_event("pdf_extracted", {"sections": len(pdf_contents), "characters": len(pdf_text)})
+
+        for event, data in copilot.process_query_stream(user_query, pdf_text, sample_pdf_text=SAMPLE_PDF_TEXT,
+                                                        sample_json=SAMPLE_JSON, rag_results=search_future):
+            yield sse_event(event, data)
+    except Exception as e:
+        logger.error("Error streaming response: %s", str(e))
+        yield sse_event("error", {"error": str(e)})
+    finally:
+        request_id_var.reset(token)
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5003, debug=True)
\ No newline at end of file
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(host="0.0.0.0", port=5003, debug=os.getenv("FLASK_DEBUG", "0") == "1")
\ No newline at end of file
@@ -1,13 +1,42 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify
 import os
-import json
-from pdf_to_json import PDFTextExtractor
+import tempfile
+from pdf_to_json import PDFTextExtractor, SECTION_TEMPLATES
+from metrics import install_metrics
+
+# Uploads up to this size are parsed straight from memory; larger ones spill to an unlinked temp file
+SPILL_THRESHOLD = int(os.getenv("PDF_SPILL_THRESHOLD", 8 * 1024 * 1024))
+MAX_UPLOAD_BYTES = int(os.getenv("PDF_MAX_UPLOAD_BYTES", 50 * 1024 * 1024))
+
+class UploadRequest(Request):
+    """Request that buffers uploaded files in memory up to SPILL_THRESHOLD."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Rolls over to an anonymous TemporaryFile, which is removed as soon as it is closed
+        return tempfile.SpooledTemporaryFile(max_size=SPILL_THRESHOLD, mode="rb+")
+
 # Flask App
 app = Flask(__name__)
-app.config['UPLOAD_FOLDER'] = "uploads"
+app.request_class = UploadRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+install_metrics(app, "pdf_to_json")
 
-if not os.path.exists(app.config['UPLOAD_FOLDER']):
-    os.makedirs(app.config['UPLOAD_FOLDER'])
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"Upload exceeds the maximum size of {MAX_UPLOAD_BYTES} bytes"}), 413
+
+@app.route('/health', methods=['GET'])
+def health():
+    """
+    Liveness endpoint: the process is up and serving requests.
+    """
+    return jsonify({'status': 'ok'}), 200
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Readiness endpoint: PDF workers start on demand, so the service is ready once it serves requests.
+    """
+    return jsonify({'status': 'ready'}), 200
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -19,14 +48,14 @@ def upload_file():
         return jsonify({"error": "No selected file"}), 400
     
     if file:
-        filename = file.filename.replace(" ", "_")  # Basic filename sanitization
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        
-        extractor = PDFTextExtractor(file_path)
-        feedback_json = extractor.get_json_feedback()
-        
-        return jsonify(json.loads(feedback_json))
+        template = request.form.get("template", "default")
+        if template not in SECTION_TEMPLATES:
+            return jsonify({"error": f"Unknown section template: {template}"}), 400
+
+        # Parse the uploaded stream directly; nothing is written under a client-chosen name
+        extractor = PDFTextExtractor(file.stream)
+        return jsonify(extractor.get_feedback(template))
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=5002, debug=True)
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(host="0.0.0.0", port=5002, debug=os.getenv("FLASK_DEBUG", "0") == "1")
@@ -1,20 +1,35 @@
 from flask import Flask, request, jsonify
+from jinja2 import TemplateNotFound
 from promptRenderer import PromptRenderer
+from metrics import install_metrics
 import json
+import os
 
 app = Flask(__name__)
+install_metrics(app, "prompt_renderer")
 
-# Load Jinja2 template from file
-with open("prompt.jinja2", "r") as file:
-    jinja_template = file.read()
+# Initialize the PromptRenderer; templates are compiled once and reloaded when edited on disk
+renderer = PromptRenderer()
 
-# Initialize the PromptRenderer
-renderer = PromptRenderer(jinja_template)
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Liveness endpoint: the process is up and serving requests.
+    """
+    return jsonify({"status": "ok"}), 200
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness endpoint: this service has nothing to warm up, so it is ready once it serves requests.
+    """
+    return jsonify({"status": "ready"}), 200
 
 @app.route("/render", methods=["POST"])
 def render_prompt():
     """
     Endpoint to render a prompt using Jinja2 template.
+    An optional "template" names one of the templates allowed by PROMPT_TEMPLATES; any other name is a 400.
     """
     try:
         data = request.get_json()
@@ -23,21 +38,28 @@ def render_prompt():
         single_shot_prompt_json = data.get("single_shot_prompt_json", "{}")
         input_pdf_text = data.get("input_pdf_text", "")
         rag_results = data.get("rag_results", [])
+        template_name = data.get("template")
 
         if not isinstance(rag_results, list):
             return jsonify({"error": "rag_results should be a list"}), 400
+        if template_name is not None and not isinstance(template_name, str):
+            return jsonify({"error": "template should be a string"}), 400
         
         rendered_prompt = renderer.render(
             user_query,
             single_shot_prompt_pdf_text,
             single_shot_prompt_json,
             input_pdf_text,
-            rag_results
+            rag_results,
+            template_name=template_name
         )
         
         return jsonify({"rendered_prompt": rendered_prompt}), 200
+    except TemplateNotFound as e:
+        return jsonify({"error": f"Unknown template: {e.name}"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(host="0.0.0.0", port=5001, debug=os.getenv("FLASK_DEBUG", "0") == "1")
@@ -1,24 +1,103 @@
 from flask import Flask, request, jsonify
-from vectordb import VectorInterviewDb
+from vectordb import VectorInterviewDb, IndexConfig, FILTER_COLUMNS, normalize_filters
+from batching import MicroBatcher
+from metrics import install_metrics
 import os
+import json
 import numpy as np
 
 app = Flask(__name__)
+install_metrics(app, "vsearch")
 
 # Initialize the vector database
 VECTOR_DB_FILE = "docs/interview_questions.xlsx"
-vector_db = VectorInterviewDb(VECTOR_DB_FILE)
+vector_db = VectorInterviewDb(VECTOR_DB_FILE,
+                              batch_size=int(os.getenv("EMBED_BATCH_SIZE", 64)),
+                              embedding_workers=int(os.getenv("EMBED_WORKERS", 0)),
+                              # e.g. VSEARCH_INDEX_CONFIG='{"index_type": "hnsw", "ef_search": 128}'
+                              index_config=IndexConfig.from_dict(json.loads(os.getenv("VSEARCH_INDEX_CONFIG", "{}"))),
+                              cache_size=int(os.getenv("VSEARCH_CACHE_SIZE", 1024)),
+                              cache_ttl=float(os.getenv("VSEARCH_CACHE_TTL", 3600)),
+                              # Under a multi-worker server, picks up an index rebuilt by another worker
+                              refresh_interval=float(os.getenv("VSEARCH_REFRESH_INTERVAL", 5)))
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", 1000))
+
+# Keep the model and corpus resident so searches never touch the model files or metadata:
+# "preload" loads them during import (gunicorn master, shared with the forked workers),
+# "background" loads them in a thread while the server already accepts connections,
+# "lazy" loads them on the first request.
+WARM_UP = os.getenv("SERVICE_WARM_UP", "background")
+if WARM_UP == "preload":
+    vector_db.warm_up(encode=False)
+elif WARM_UP == "background":
+    vector_db.warm_up(background=True)
+
+def search_grouped(requests):
+    """
+    Searches a list of (query, top_k, filters, collapse) tuples with one encode and one FAISS
+    search per distinct combination of top_k, filters and collapse.
+    Each group is searched on its own: a failing group fails only its own requests, as its
+    results are the exception, which the batcher raises to those callers.
+    :return: One result DataFrame per tuple (or the exception of its group), or None for every tuple if no index exists.
+    """
+    results = [None] * len(requests)
+    groups = {}
+    for i, (_, top_k, filters, collapse) in enumerate(requests):
+        groups.setdefault((top_k, json.dumps(filters, sort_keys=True), collapse), []).append(i)
+    for (top_k, _, collapse), positions in groups.items():
+        try:
+            found = vector_db.search_many([requests[i][0] for i in positions], top_k=top_k,
+                                          filters=requests[positions[0]][2], collapse=collapse)
+        except Exception as e:
+            found = [e] * len(positions)
+        if found is not None:
+            for i, result in zip(positions, found):
+                results[i] = result
+    return results
+
+def parse_top_k(value):
+    """Parses the top_k parameter; raises ValueError unless it is a positive integer."""
+    try:
+        top_k = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("top_k should be an integer")
+    if top_k < 1:
+        raise ValueError("top_k should be at least 1")
+    return top_k
+
+# Concurrent /search requests are encoded and searched together; VSEARCH_BATCH_SIZE=0 disables batching
+SEARCH_BATCH_SIZE = int(os.getenv("VSEARCH_BATCH_SIZE", 32))
+search_batcher = (MicroBatcher(search_grouped, max_batch_size=SEARCH_BATCH_SIZE,
+                               max_wait_ms=float(os.getenv("VSEARCH_BATCH_WAIT_MS", 2)), name="search-batcher")
+                  if SEARCH_BATCH_SIZE > 0 else None)
+
+@app.route("/health", methods=["GET"])
+def health():
+    """
+    Liveness endpoint: the process is up and serving requests.
+    """
+    return jsonify({"status": "ok"}), 200
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness endpoint: 200 once the model and index are loaded, 503 while warming up.
+    """
+    if vector_db.is_ready():
+        return jsonify({"status": "ready"}), 200
+    return jsonify({"status": "warming up", "error": vector_db.warm_up_error}), 503
 
 @app.route("/index", methods=["POST"])
 def index_documents():
     """
     Endpoint to index interview questions from the given document.
+    Pass `incremental=true` to re-embed only new or changed questions.
     """
+    incremental = request.args.get("incremental", "false").lower() == "true"
     try:
-        if os.path.exists(vector_db.FAISS_INDEX_FILE):
-            os.remove(vector_db.FAISS_INDEX_FILE)
-        vector_db.populate_index()
-        return jsonify({"message": "Indexing completed successfully."}), 200
+        # The index is replaced atomically, so searches keep working during a rebuild
+        stats = vector_db.populate_index(incremental=incremental)
+        return jsonify({"message": "Indexing completed successfully.", "stats": stats}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -26,29 +105,95 @@ def index_documents():
 def search_documents():
     """
     Endpoint to search for relevant interview questions using FAISS.
+    Optional `level` and `difficulty` parameters (repeated or comma-separated) restrict the search
+    to matching questions; `collapse=true` returns one chunk per question.
     """
     query = request.args.get("query")
-    top_k = int(request.args.get("top_k", 5))
+    collapse = request.args.get("collapse", "false").lower() == "true"
 
     if not query:
         return jsonify({"error": "Query parameter is required."}), 400
+    try:
+        # Validated before batching: a bad request must not fail the requests batched with it
+        top_k = parse_top_k(request.args.get("top_k", 5))
+        filters = normalize_filters({column: [value.strip() for values in request.args.getlist(column)
+                                              for value in values.split(",") if value.strip()]
+                                     for column in FILTER_COLUMNS})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        results = vector_db.search_faiss(query, top_k=top_k)
+        if search_batcher is not None:
+            results = search_batcher((query, top_k, filters, collapse))
+        else:
+            results = vector_db.search_faiss(query, top_k=top_k, filters=filters, collapse=collapse)
+        if results is None:
+            return jsonify({"error": "Index has not been built yet."}), 503
+
+        return jsonify({"results": to_records(results)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/search/batch", methods=["POST"])
+def search_documents_batch():
+    """
+    Endpoint to search many queries at once: one batched encode and one FAISS search.
+    Expects JSON {"queries": [...], "top_k": 5} and returns one result list per query;
+    optional "filters" ({"level": [...], "difficulty": [...]}) and "collapse" apply to every query.
+    """
+    data = request.get_json(silent=True) or {}
+    queries = data.get("queries")
+    collapse = bool(data.get("collapse", False))
 
-        # Convert DataFrame to a JSON-serializable format
-        search_results = results.to_dict(orient="records")
+    if not isinstance(queries, list) or not all(isinstance(q, str) and q for q in queries):
+        return jsonify({"error": "queries should be a list of non-empty strings"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}), 400
+    if not isinstance(data.get("filters") or {}, dict):
+        return jsonify({"error": "filters should be an object"}), 400
+    try:
+        top_k = parse_top_k(data.get("top_k", 5))
+        filters = normalize_filters(data.get("filters"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Ensure no NumPy arrays are in the response
-        for item in search_results:
-            for key, value in item.items():
-                if isinstance(value, np.ndarray):  # Convert ndarray to list
-                    item[key] = value.tolist()
+    try:
+        results = vector_db.search_many(queries, top_k=top_k, filters=filters, collapse=collapse)
+        if results is None:
+            return jsonify({"error": "Index has not been built yet."}), 503
 
-        return jsonify({"results": search_results}), 200
+        return jsonify({"results": [to_records(result) for result in results]}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """
+    Endpoint reporting hit/miss counters of the query embedding and search result caches.
+    """
+    return jsonify(vector_db.cache_stats()), 200
+
+@app.route("/batching/stats", methods=["GET"])
+def batching_stats():
+    """
+    Endpoint reporting queue depth and batch sizes of the /search micro-batcher.
+    """
+    if search_batcher is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify(dict(search_batcher.stats(), enabled=True)), 200
+
+def to_records(results):
+    """Converts a result DataFrame to a JSON-serializable list of dicts."""
+    search_results = results.to_dict(orient="records")
+
+    # Ensure no NumPy arrays are in the response
+    for item in search_results:
+        for key, value in item.items():
+            if isinstance(value, np.ndarray):  # Convert ndarray to list
+                item[key] = value.tolist()
+    return search_results
+
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    app.run(host="0.0.0.0", port=5000, debug=os.getenv("FLASK_DEBUG", "0") == "1")
\ No newline at end of file